@@ -0,0 +1,80 @@
+"""
+Compares the token search of the TinyCSSParser with the recursive one it
+replaced. The stylesheets are parsed by tinycss2 once, only the token
+search is timed. The corpus is the stylesheets of the given files and
+directories, or the samples of the equivalence test when none is given.
+
+    python benchmarks/css_parser_benchmark.py [--repeat N] [PATH ...]
+"""
+import argparse
+import os
+import pathlib
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "tests"))
+
+from lemmiwinks.parslib import parser  # noqa: E402
+
+import css_reference  # noqa: E402
+
+
+def iterative_search(corpus):
+    for rules in corpus:
+        parser.TinyCSSParser(rules).parse_tokens()
+
+
+def recursive_search(corpus):
+    for rules in corpus:
+        css_reference.recursive_tokens(rules)
+
+
+def load_corpus(paths):
+    if not paths:
+        return [css_reference.parse_stylesheet(data) for data in css_reference.SAMPLE_STYLESHEETS]
+
+    files = list()
+
+    for path in map(pathlib.Path, paths):
+        files.extend(sorted(path.rglob("*.css")) if path.is_dir() else [path])
+
+    return [css_reference.parse_stylesheet(path.read_bytes().decode("utf-8", "replace"))
+            for path in files]
+
+
+def measure(search, corpus, repeat):
+    timings = list()
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        search(corpus)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    search(corpus)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), peak
+
+
+def main():
+    argument_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    argument_parser.add_argument("paths", nargs="*", help="stylesheets or directories")
+    argument_parser.add_argument("--repeat", type=int, default=20,
+                                 help="passes over the corpus, the median is reported")
+    arguments = argument_parser.parse_args()
+
+    corpus = load_corpus(arguments.paths)
+    print(f"{len(corpus)} stylesheets, {arguments.repeat} passes")
+
+    for name, search in (("recursive", recursive_search), ("iterative", iterative_search)):
+        median, peak = measure(search, corpus, arguments.repeat)
+        print(f"{name:>10}: {median * 1000:9.2f} ms per pass, peak {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,4 +2,6 @@ from .archive import Archive
 from .archive import SaveResponseLetter
 from .archive import Envelop
 from .archive import Mode
+from .maff import CompressionPolicy
+from .reader import MaffReader
 from . import abstract
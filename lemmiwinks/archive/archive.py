@@ -1,9 +1,12 @@
+import asyncio
 import logging
 import pathlib
 import enum
 
 import magic
 
+import lemmiwinks.taskwrapper as taskwrapper
+
 from . import maff
 from . import abstract
 from . import migration
@@ -18,14 +21,20 @@ class _HTMLResponseLetter(abstract.BaseLetter):
 
         self.__index_file = None
         self.__index_migration = index_migration
+        self.__register = None
 
         self.__archive_time = rdfinfo.TimeMaffRDFInfo()
         self.__file_info = rdfinfo.ResponseMaffRDFInfo(response)
 
     async def write_to(self, location):
+        self.__register = self.__create_register(location)
         self.__create_index_files_dir_in(location)
-        await self.__save_response_to(location)
+
+        with self.__response:
+            await self.__save_response_to(location)
+
         self.__create_rdf_to(location)
+        self.__register.manifest.save_to(location, self.__register.sink.exists)
 
     @staticmethod
     def __create_index_files_dir_in(location):
@@ -44,11 +53,44 @@ class _HTMLResponseLetter(abstract.BaseLetter):
         res_location = str(pathlib.Path(location).joinpath("index_files"))
 
         self.__index_file = self.__index_migration(
-            self.__response, filepath, res_location, self.__settings)
+            self.__response, filepath, res_location, self.__settings,
+            register=self.__register)
+
+        try:
+            await self.__register.deadline.wait_for(self.__migrate_index_file())
+        except asyncio.TimeoutError:
+            # the outstanding work is cancelled, the index is exported
+            # with the resources fetched so far
+            await self.__register.planner.cancel()
+            self.__logger.warning(f"deadline of {self.__file_info.url} expired")
+
+        await self.__index_file.export()
 
+    async def __migrate_index_file(self):
         await self.__index_file.migrate_external_sources()
+        await self.__register.planner.run()
+
+    def __create_register(self, location):
+        # the files are streamed to the archive through its tab, the files
+        # stored by the other tabs of the archive are reused
+        sink = location if isinstance(location, maff.Tab) else None
+        envelope = sink.resources if sink is not None else None
+        planner = migration.ResourcePlanner()
+        deadline = taskwrapper.Deadline(self.__settings.job_timeout,
+                                        self.__settings.stage_timeouts)
+
+        if self.__settings.shared_register is None:
+            shared = None
+        else:
+            shared = self.__settings.shared_register()
+
+        if self.__settings.previous_snapshot is None:
+            previous = None
+        else:
+            previous = self.__settings.previous_snapshot().tab_for(self.__file_info.url)
 
-        self.__index_file.export()
+        return migration.ResourceRegister(
+            shared, planner, deadline, self.__file_info.url, previous, sink, envelope)
 
     def __create_rdf_to(self, location):
         rdf_path = str(pathlib.Path(location).joinpath("index.rdf"))
@@ -57,13 +99,22 @@ class _HTMLResponseLetter(abstract.BaseLetter):
             self.__init_attributes_of(rdf_file)
 
     def __init_attributes_of(self, rdf_file):
-        html_info = rdfinfo.ParserMaffRDFInfo(self.__index_file.parser)
+        html_info = self.__html_info()
 
         rdf_file.title = html_info.title
         rdf_file.url = self.__file_info.url
         rdf_file.index_file_name = self.__file_info.index_name
         rdf_file.archive_time = self.__archive_time.time
         rdf_file.charset = html_info.charset
+        rdf_file.missing_resources = self.__register.missing()
+
+    def __html_info(self):
+        # the index which was not parsed before the deadline is described
+        # by its response
+        if self.__index_file is not None and self.__index_file.loaded:
+            return rdfinfo.ParserMaffRDFInfo(self.__index_file.parser)
+        else:
+            return self.__file_info
 
 
 class _ResponseLetter(abstract.BaseLetter):
@@ -80,7 +131,7 @@ class _ResponseLetter(abstract.BaseLetter):
         index_name = self.__file_info.index_name
         index_path = str(pathlib.Path(location).joinpath(index_name))
 
-        with open(index_path, "wb") as fd:
+        with self.__response, open(index_path, "wb") as fd:
             fd.write(self.__response.content_descriptor.read())
 
     def __create_rdf_to(self, location):
@@ -105,9 +156,12 @@ class SaveResponseLetter(abstract.BaseLetter):
         self.__mode = mode
 
     async def write_to(self, location):
+        # the response holds the descriptor of its body until the letter
+        # is written
         try:
-            response_letter = self.__get_response_letter()
-            await response_letter.write_to(location)
+            with self.__response:
+                response_letter = self.__get_response_letter()
+                await response_letter.write_to(location)
         except Exception as e:
             self.__logger.exception(e)
             self.__logger.error(self.__mode)
@@ -163,8 +217,70 @@ class Envelop(list):
 
 class Archive:
     @classmethod
-    async def archive_as_maff(cls, envelop, archive_filepath):
-        with maff.MozillaArchiveFormat(archive_filepath) as archive:
-            for letter in envelop:
-                location = archive.create_tab()
+    async def archive_as_maff(cls, envelop, archive_filepath, compression=None,
+                              max_concurrent_letters=None, append=False):
+        # the letters are written at the same time, each to its own tab,
+        # the tabs keep the order of the envelop in the archive and share
+        # the downloaded resources
+        semaphore = asyncio.Semaphore(max_concurrent_letters or len(envelop) or 1)
+        resources = migration.EnvelopeRegister()
+
+        async with maff.MozillaArchiveFormat(archive_filepath, compression=compression,
+                                             resources=resources, append=append) as archive:
+            tabs = [archive.create_tab() for _ in envelop]
+            results = await asyncio.gather(
+                *(cls.__write_letter(archive, letter, tab, semaphore)
+                  for letter, tab in zip(envelop, tabs)),
+                return_exceptions=True)
+
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+
+        return archive.manifests
+
+    @classmethod
+    async def archive_as_warc(cls, envelop, warc_writer, max_concurrent_letters=None):
+        """
+        Writes the RDF of every letter to the metadata record of its page.
+        The request and response records are written by the recording
+        clients, so the clients of the letters and the recorder of their
+        settings should record to the warc_writer. The letters are written
+        to the temporary tabs, which are discarded.
+        """
+        semaphore = asyncio.Semaphore(max_concurrent_letters or len(envelop) or 1)
+        tabs = [maff.Tab() for _ in envelop]
+
+        try:
+            results = await asyncio.gather(
+                *(cls.__record_letter(warc_writer, letter, tab, semaphore)
+                  for letter, tab in zip(envelop, tabs)),
+                return_exceptions=True)
+        finally:
+            for tab in tabs:
+                tab.cleanup()
+
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+
+    @staticmethod
+    async def __record_letter(warc_writer, letter, location, semaphore):
+        async with semaphore:
+            await letter.write_to(location)
+
+        rdf_path = pathlib.Path(location).joinpath("index.rdf")
+
+        if rdf_path.exists():
+            rdf_file = maff.RDF.load(str(rdf_path))
+            await asyncio.get_event_loop().run_in_executor(
+                None, warc_writer.write_metadata,
+                rdf_file.url, rdf_path.read_bytes(), "application/rdf+xml")
+
+    @staticmethod
+    async def __write_letter(archive, letter, location, semaphore):
+        try:
+            async with semaphore:
                 await letter.write_to(location)
+        finally:
+            archive.close_tab(location)
@@ -2,42 +2,661 @@ import tempfile
 import logging
 import zipfile
 import os
+import io
+import shutil
+import math
+import zlib
+import asyncio
+import collections
+import concurrent.futures
+import hashlib
+import json
+import mimetypes
+import threading
 import xml.etree.ElementTree as ET
 
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# the method of the zstd compressed zip entries, it needs the version 6.3
+ZIP_ZSTANDARD = getattr(zipfile, "ZIP_ZSTANDARD", 93)
+ZSTANDARD_VERSION = 63
+
+
+class CompressionPolicy:
+    """
+    Chooses the compression of each zip entry. The entries of the already
+    compressed media types are stored, the text types are deflated with
+    the level. The entries of the unknown types are decided by the entropy
+    of their first bytes, the sample above the entropy_threshold bits per
+    byte is stored and the other is deflated with the sampled_level. The
+    entries written without a sample are deflated.
+
+    The text types are compressed by zstd with the zstd_level when it is
+    given, the optional zstd_dictionary, such as the one trained by the
+    train_zstd_dictionary method, is shared by all tabs. The zstd entries
+    need the zstandard package and they are read by the reader.MaffReader.
+    """
+
+    DICTIONARY_NAME = "dictionary-{}.zstd"
+    # the metadata of the tabs is deflated, so it stays readable by the MAFF readers
+    ZSTANDARD_EXCLUDED_TYPES = frozenset({"application/rdf+xml"})
+
+    STORED_TYPES = frozenset({
+        "application/zip", "application/gzip", "application/x-gzip",
+        "application/x-bzip2", "application/x-xz", "application/x-7z-compressed",
+        "application/x-rar-compressed", "application/vnd.rar", "application/zstd",
+        "application/ogg", "application/wasm", "application/pdf",
+        "font/woff", "font/woff2", "application/font-woff",
+        "image/jpeg", "image/png", "image/gif", "image/webp", "image/avif",
+        "image/heic", "image/heif", "image/jp2", "image/jxl",
+    })
+    STORED_PREFIXES = ("video/", "audio/")
+    DEFLATED_TYPES = frozenset({
+        "application/javascript", "application/x-javascript", "application/json",
+        "application/xml", "application/xhtml+xml", "application/rdf+xml",
+        "application/manifest+json", "image/svg+xml", "image/bmp",
+        "image/vnd.microsoft.icon", "image/x-icon", "font/ttf", "font/otf",
+        "application/x-font-ttf", "application/vnd.ms-fontobject",
+    })
+    DEFLATED_PREFIXES = ("text/",)
+    EXTENSIONS = {
+        ".woff": "font/woff", ".woff2": "font/woff2", ".webp": "image/webp",
+        ".avif": "image/avif", ".mjs": "application/javascript",
+        ".wasm": "application/wasm", ".ttf": "font/ttf", ".otf": "font/otf",
+    }
+
+    def __init__(self, level=6, sampled_level=1, sample_size=64 * 1024,
+                 entropy_threshold=7.5, zstd_level=None, zstd_dictionary=None):
+        if zstd_level is not None or zstd_dictionary is not None:
+            _require_zstandard()
+        if isinstance(zstd_dictionary, bytes):
+            zstd_dictionary = zstandard.ZstdCompressionDict(zstd_dictionary)
+
+        self.level = level
+        self.sampled_level = sampled_level
+        self.sample_size = sample_size
+        self.entropy_threshold = entropy_threshold
+        self.zstd_level = zstd_level
+        self.zstd_dictionary = zstd_dictionary
+        # the zstd compressors of the compressing threads, by their level
+        self._zstd_compressors = threading.local()
+
+    @property
+    def dictionary_name(self):
+        # the root entry of the dictionary, the zstd frames refer to its id
+        if self.zstd_level is None or self.zstd_dictionary is None:
+            return None
+        else:
+            return self.DICTIONARY_NAME.format(self.zstd_dictionary.dict_id())
+
+    @staticmethod
+    def train_zstd_dictionary(samples, dict_size=112640):
+        """
+        Trains the zstd dictionary on the samples, such as the documents
+        and stylesheets read from the previous archives of the site.
+        """
+        _require_zstandard()
+        return zstandard.train_dictionary(dict_size, list(samples))
+
+    def compressor_of(self, compress_type, level):
+        """
+        Returns the compressor object of the entry, or None for the stored.
+        """
+        if compress_type == zipfile.ZIP_DEFLATED:
+            return zlib.compressobj(
+                zlib.Z_DEFAULT_COMPRESSION if level is None else level, zlib.DEFLATED, -15)
+        elif compress_type == ZIP_ZSTANDARD:
+            return self.__zstd_compressor_of(level).compressobj()
+        else:
+            return None
+
+    def __zstd_compressor_of(self, level):
+        # the compressor is reused by the entries compressed by the thread,
+        # it is not shared by the threads
+        compressors = self._zstd_compressors.__dict__
+
+        if level not in compressors:
+            compressors[level] = zstandard.ZstdCompressor(
+                level=level, dict_data=self.zstd_dictionary)
+
+        return compressors[level]
+
+    def compression_of(self, arcname, source=None):
+        """
+        Returns the compress type and the compress level of the entry,
+        the source is the path of the entry content when it is known.
+        """
+        mime = self.mime_of(arcname)
+
+        if mime in self.STORED_TYPES or mime.startswith(self.STORED_PREFIXES):
+            return zipfile.ZIP_STORED, None
+        elif (self.__is_text(mime) and self.zstd_level is not None
+              and mime not in self.ZSTANDARD_EXCLUDED_TYPES):
+            return ZIP_ZSTANDARD, self.zstd_level
+        elif self.__is_text(mime):
+            return zipfile.ZIP_DEFLATED, self.level
+        elif source is not None and self.__is_incompressible(source):
+            return zipfile.ZIP_STORED, None
+        else:
+            return zipfile.ZIP_DEFLATED, self.sampled_level
+
+    def mime_of(self, arcname):
+        extension = os.path.splitext(arcname)[1].lower()
+        mime = self.EXTENSIONS.get(extension) or mimetypes.guess_type(f"entry{extension}")[0]
+
+        return mime or "application/octet-stream"
+
+    def __is_text(self, mime):
+        return mime in self.DEFLATED_TYPES or mime.startswith(self.DEFLATED_PREFIXES)
+
+    def __is_incompressible(self, source):
+        try:
+            with open(source, "rb") as fd:
+                sample = fd.read(self.sample_size)
+        except OSError:
+            return False
+
+        return len(sample) > 0 and _entropy_of(sample) > self.entropy_threshold
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("The zstd compression needs the zstandard package, "
+                          "install it by 'pip install lemmiwinks[zstd]'.")
+
+
+def _entropy_of(sample):
+    # Shannon entropy of the sample in bits per byte
+    total = len(sample)
+    counts = collections.Counter(sample).values()
+
+    return -sum(count / total * math.log2(count / total) for count in counts)
+
+
+WrittenEntry = collections.namedtuple("WrittenEntry", "zip_info sha256")
+IntegrityEntry = collections.namedtuple("IntegrityEntry", "path size sha256 url status mime")
+
+
+class ZipWriter:
+    """
+    Writer of the zip entries. The entries are compressed in parallel by
+    the thread pool, zlib releases the GIL while it compresses, and the
+    compressed entries are written to the zip file by the single writer
+    thread in the order of their submission. The SHA-256 of every entry is
+    computed while it is compressed, the futures of the submissions give
+    the written entries.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+    # the compressed entries up to the size are kept in the memory until
+    # they are written, the bigger ones are spooled to the temporary files
+    SPOOL_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, zip_file, compression=None, max_workers=None):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._zip_file = zip_file
+        self._compression = compression or CompressionPolicy()
+        self._compressors = concurrent.futures.ThreadPoolExecutor(max_workers)
+        self._writer = concurrent.futures.ThreadPoolExecutor(1)
+
+    def submit(self, filepath, arcname, remove=False):
+        """
+        Adds the file to the zip file as the arcname, the file is removed
+        once it is written when the remove flag is set.
+        """
+        compressed = self._compressors.submit(self.__compress, filepath, arcname)
+        return self._writer.submit(self.__write, compressed, filepath, arcname, remove)
+
+    def submit_data(self, arcname, data_factory):
+        """
+        Adds the data returned by the factory to the zip file as the
+        arcname. The factory is called by the writer thread, after all
+        the entries submitted before are written.
+        """
+        return self._writer.submit(self.__write_data, arcname, data_factory)
+
+    def close(self):
+        try:
+            self._writer.shutdown(wait=True)
+            self._compressors.shutdown(wait=True)
+        finally:
+            self._zip_file.close()
+
+    def __compress(self, filepath, arcname):
+        zip_info = zipfile.ZipInfo.from_file(filepath, arcname)
+        zip_info.compress_type, level = self._compression.compression_of(arcname, filepath)
+        compressor = self._compression.compressor_of(zip_info.compress_type, level)
+        output = None if compressor is None else tempfile.SpooledTemporaryFile(self.SPOOL_SIZE)
+
+        if zip_info.compress_type == ZIP_ZSTANDARD:
+            zip_info.create_version = zip_info.extract_version = ZSTANDARD_VERSION
+
+        try:
+            zip_info.CRC, zip_info.file_size, sha256 = self.__read(filepath, compressor, output)
+        except BaseException:
+            if output is not None:
+                output.close()
+            raise
+
+        if output is None:
+            zip_info.compress_size = zip_info.file_size
+        else:
+            output.write(compressor.flush())
+            zip_info.compress_size = output.tell()
+            output.seek(0)
+
+        return zip_info, sha256, output
+
+    def __read(self, filepath, compressor, output):
+        crc = 0
+        size = 0
+        sha256 = hashlib.sha256()
+
+        with open(filepath, "rb") as fd:
+            for chunk in iter(lambda: fd.read(self.CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                sha256.update(chunk)
+
+                if compressor is not None:
+                    output.write(compressor.compress(chunk))
+
+        return crc, size, sha256.hexdigest()
+
+    def __write(self, compressed, filepath, arcname, remove):
+        try:
+            return self.__write_compressed(compressed.result(), filepath)
+        except Exception as e:
+            self.__logger.error(f"Cannot archive {arcname}: {e}")
+            return None
+        finally:
+            if remove:
+                _unlink(filepath)
+
+    def __write_data(self, arcname, data_factory):
+        try:
+            with tempfile.NamedTemporaryFile() as fd:
+                fd.write(data_factory())
+                fd.flush()
+
+                return self.__write_compressed(self.__compress(fd.name, arcname), fd.name)
+        except Exception as e:
+            self.__logger.error(f"Cannot archive {arcname}: {e}")
+            return None
+
+    def __write_compressed(self, compressed, filepath):
+        zip_info, sha256, output = compressed
+
+        with output if output is not None else open(filepath, "rb") as fd:
+            _write_compressed_entry(self._zip_file, zip_info, fd, self.CHUNK_SIZE)
+
+        return WrittenEntry(zip_info, sha256)
+
+
+def _write_compressed_entry(zip_file, zip_info, fd, chunk_size):
+    # zipfile cannot write an entry compressed beforehand, the entry is
+    # written the way ZipFile.open(zip_info, "w") writes it to a seekable
+    # file. It is the only use of the zipfile internals (_lock, _writing,
+    # _didModify, fp, start_dir, filelist and NameToInfo), they are checked
+    # against the zipfile module of CPython 3.6 to 3.12.
+    zip64 = max(zip_info.file_size, zip_info.compress_size) > zipfile.ZIP64_LIMIT
+
+    if zip_info.filename in zip_file.NameToInfo:
+        raise FileExistsError(f"{zip_info.filename} is in the archive already.")
+
+    with zip_file._lock:
+        if zip_file._writing:
+            raise ValueError("The zip file has an open write handle.")
+
+        zip_file.fp.seek(zip_file.start_dir)
+        zip_info.header_offset = zip_file.fp.tell()
+        zip_file.fp.write(zip_info.FileHeader(zip64))
+        shutil.copyfileobj(fd, zip_file.fp, chunk_size)
+
+        zip_file.filelist.append(zip_info)
+        zip_file.NameToInfo[zip_info.filename] = zip_info
+        zip_file.start_dir = zip_file.fp.tell()
+        zip_file._didModify = True
+
+
+class _EntryFile(io.FileIO):
+    # file of the streamed tab, it is submitted to the writer once closed
+    def __init__(self, path, on_close):
+        super().__init__(path, "wb")
+        self.__on_close = on_close
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self.__on_close()
+
+
+class Tab(os.PathLike):
+    """
+    Tab of the archive. The tab is the path of its temporary directory, so
+    the letters can write the files to it. The files stored by the store
+    method or written by the open method are submitted to the zip writer
+    when the archive is streamed, and removed from the directory once they
+    are written. The files are held back until the tab is released, so the
+    entries of the tabs written at the same time are not interleaved. The
+    other files are zipped when the tab is closed.
+
+    The integrity manifest of the tab is written to the archive after the
+    other entries of the tab. It lists the path, size and SHA-256 of every
+    entry with the URL, HTTP status and MIME type given by the describe
+    method.
+    """
+
+    INTEGRITY_NAME = "integrity.json"
+
+    def __init__(self, writer=None, entries=None, resources=None):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._directory = tempfile.TemporaryDirectory()
+        self._writer = writer
+        # the entries of the archive, the tabs of one archive share them
+        self._entries = entries if entries is not None else set()
+        self._resources = resources
+        self._deferred = list()
+        self._released = False
+        self._written = list()
+        self._sources = dict()
+        self._integrity = None
+
+    def __fspath__(self):
+        return self._directory.name
+
+    def __str__(self):
+        return self._directory.name
+
+    @property
+    def name(self):
+        return self._directory.name
+
+    @property
+    def streamed(self):
+        return self._writer is not None
+
+    @property
+    def integrity(self):
+        # the integrity manifest, it is known once the tab is written
+        return self._integrity
+
+    @property
+    def resources(self):
+        # the files shared by the tabs of the archive, such as the
+        # migration.EnvelopeRegister
+        return self._resources
+
+    def arcname_of(self, path):
+        return os.path.relpath(os.fspath(path), os.path.dirname(self.name)).replace(os.sep, "/")
+
+    def exists(self, path):
+        return self.arcname_of(path) in self._entries or os.path.exists(path)
+
+    def store(self, path, source):
+        """
+        Stores the content of the source file to the path of the tab.
+        """
+        _link_or_copy(source, path)
+
+        if self.streamed:
+            self.__submit(path)
+
+    def open(self, path, mode="wb"):
+        """
+        Opens the path of the tab for the binary writing.
+        """
+        if mode != "wb":
+            raise ValueError(f"Tab supports only 'wb' mode, not '{mode}'.")
+        elif not self.streamed:
+            return open(path, mode)
+        else:
+            return _EntryFile(path, lambda: self.__submit(path))
+
+    def describe(self, path, url=None, status=None, mime=None):
+        """
+        Records the source of the file for the integrity manifest, the
+        file stored for several URLs is described by the first one.
+        """
+        self._sources.setdefault(self.arcname_of(path), (url, status, mime))
+
+    def __submit(self, path):
+        arcname = self.arcname_of(path)
+        self._entries.add(arcname)
+
+        if self._released:
+            self.__submit_to(self._writer, os.fspath(path), arcname, remove=True)
+        else:
+            self._deferred.append((os.fspath(path), arcname))
+
+    def __submit_to(self, writer, path, arcname, remove=False):
+        self._written.append((arcname, writer.submit(path, arcname, remove=remove)))
+
+    def release(self):
+        """
+        Submits the held back files to the zip writer, the files stored
+        later are submitted right away.
+        """
+        self._released = True
+
+        for path, arcname in self._deferred:
+            self.__submit_to(self._writer, path, arcname, remove=True)
+
+        self._deferred.clear()
+
+    def write_to(self, writer):
+        for dirpath, _, file_names in os.walk(self.name):
+            for file_name in file_names:
+                filepath = os.path.join(dirpath, file_name)
+                arcname = self.arcname_of(filepath)
+
+                if arcname not in self._entries:
+                    self._entries.add(arcname)
+                    self.__submit_to(writer, filepath, arcname)
+
+        arcname = self.arcname_of(os.path.join(self.name, self.INTEGRITY_NAME))
+        self._entries.add(arcname)
+        writer.submit_data(arcname, self.__integrity_manifest)
+
+    def __integrity_manifest(self):
+        # called by the writer thread once the entries of the tab are written
+        entries = list()
+
+        for arcname, future in self._written:
+            written = future.result()
+
+            if written is None:
+                continue
+
+            url, status, mime = self._sources.get(arcname, (None, None, None))
+            entries.append(IntegrityEntry(
+                arcname.partition("/")[2], written.zip_info.file_size, written.sha256,
+                url, status, mime or mimetypes.guess_type(arcname)[0]))
+
+        self._integrity = entries
+        return json.dumps([entry._asdict() for entry in entries], indent=1).encode("utf-8")
+
+    def cleanup(self):
+        try:
+            self._directory.cleanup()
+        except OSError as e:
+            self.__logger.warning(e)
+
+
+def _link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # the copy is written to the partial file first, so the failed
+        # copy does not leave the truncated file at the destination
+        partial = f"{os.fspath(dst)}.part"
+
+        try:
+            shutil.copyfile(src, partial)
+            os.replace(partial, dst)
+        except BaseException:
+            _unlink(partial)
+            raise
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
 
 class MozillaArchiveFormat:
-    def __init__(self, filepath: str):
+    """
+    Writer of the MAFF archive. The streamed archive writes the zip file
+    while the letters are written to the tabs, otherwise the zip file is
+    made from the tab directories at the exit. The compression of each
+    entry is chosen by the compression policy, the entries are compressed
+    by max_workers threads. The archive used by async with is made in an
+    executor, so the event loop keeps running while it is made.
+
+    The tabs are zipped in the order of their creation, however they are
+    written. The first open tab is streamed, the entries of the tabs after
+    it are held back until it is closed by the close_tab method.
+
+    The archive in the append mode keeps the tabs of the existing archive,
+    the entries of the new tabs are written over its central directory and
+    the new central directory is written at the end. The new tab gets other
+    directory when its name is taken by a tab of the existing archive.
+    """
+
+    def __init__(self, filepath: str, streamed=True, compression=None, max_workers=None,
+                 resources=None, append=False):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._filepath = filepath
+        self._streamed = streamed
+        self._compression = compression or CompressionPolicy()
+        self._max_workers = max_workers
+        self._resources = resources
+        self._append = append
+        self._writer = None
+        self._entries = set()
+        self._tab_names = set()
         self._tabs = list()
+        self._manifests = collections.OrderedDict()
+        self._closed_tabs = set()
+        self._zipped_tabs = 0
+
+    @property
+    def archive_path(self):
+        return f"{self._filepath}.maff"
+
+    @property
+    def manifests(self):
+        # the integrity manifests of the tabs by their names, they are known
+        # once the archive is made
+        return self._manifests
 
     def __enter__(self):
+        if self._append:
+            self.__read_existing_tabs()
+        if self._streamed:
+            self._writer = self.__open_writer()
+
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.make_archive()
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.make_archive)
+
+    def __read_existing_tabs(self):
+        if not os.path.exists(self.archive_path):
+            return
+
+        with zipfile.ZipFile(self.archive_path) as zip_file:
+            for name in zip_file.namelist():
+                self._entries.add(name)
+                self._tab_names.add(name.partition("/")[0])
+
+    def __open_writer(self):
+        mode = 'a' if self._append else 'w'
+        zip_file = zipfile.ZipFile(self.archive_path, mode, zipfile.ZIP_DEFLATED)
+        writer = ZipWriter(zip_file, self._compression, self._max_workers)
+        dictionary_name = self._compression.dictionary_name
+
+        # the dictionary of the zstd entries is stored once in the root
+        if dictionary_name is not None and dictionary_name not in self._entries:
+            self._entries.add(dictionary_name)
+            writer.submit_data(dictionary_name, self._compression.zstd_dictionary.as_bytes)
+
+        return writer
+
     def create_tab(self):
-        tab = tempfile.TemporaryDirectory()
+        tab = Tab(self._writer, self._entries, self._resources)
+
+        while tab.arcname_of(tab.name) in self._tab_names:
+            self.__logger.warning(f"tab {tab.arcname_of(tab.name)} exists in the archive")
+            tab.cleanup()
+            tab = Tab(self._writer, self._entries, self._resources)
+
+        self._tab_names.add(tab.arcname_of(tab.name))
         self._tabs.append(tab)
+        self.__zip_closed_tabs_to(self._writer)
+
+        return tab
 
-        return tab.name
+    def close_tab(self, tab):
+        self._closed_tabs.add(tab)
+        self.__zip_closed_tabs_to(self._writer)
 
     def make_archive(self):
-        archive_name = f"{self._filepath}.maff"
+        writer = self._writer or self.__open_writer()
+
+        try:
+            try:
+                self._closed_tabs.update(self._tabs)
+                self.__zip_closed_tabs_to(writer)
+            finally:
+                writer.close()
+
+            for tab in self._tabs:
+                self._manifests[tab.arcname_of(tab.name)] = tab.integrity
+        finally:
+            self._writer = None
+            self.__cleanup_tabs()
 
-        with zipfile.ZipFile(archive_name, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            self.__zip_directory_to(zip_file)
+        return self._manifests
 
-    def __zip_directory_to(self, zip_file):
+    def __zip_closed_tabs_to(self, writer):
+        # the closed tabs are zipped up to the first open one, which is released
+        while writer is not None and self._zipped_tabs < len(self._tabs):
+            tab = self._tabs[self._zipped_tabs]
+
+            if tab.streamed:
+                tab.release()
+            if tab not in self._closed_tabs:
+                break
+
+            tab.write_to(writer)
+            self._zipped_tabs += 1
+
+    def __cleanup_tabs(self):
         for tab in self._tabs:
-            for dirpath, _, file_names in os.walk(tab.name):
-                for file_name in file_names:
-                    filepath = os.path.join(dirpath, file_name)
-                    arcname = os.path.relpath(filepath, os.path.dirname(tab.name))
-                    zip_file.write(filepath, arcname)
+            tab.cleanup()
 
 
 class RDF:
+    NAMESPACES = {
+        "MAF": "http://maf.mozdev.org/metadata/rdf#",
+        "NC": "http://home.netscape.com/NC-rdf#",
+        "RDF": "http://www.w3.org/1999/02/22-rdf-syntax-ns#",
+        "LW": "urn:lemmiwinks:metadata:rdf#",
+    }
+
     def __init__(self, filepath):
         self._filepath = filepath
         self._xml = None
@@ -51,14 +670,32 @@ class RDF:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.save()
 
+    @classmethod
+    def load(cls, source, filepath=None):
+        """
+        Reads the RDF file from the source, the path or the file object.
+        The properties with the resource attribute are kept.
+        """
+        rdf = cls(filepath or source)
+        prefixes = {namespace: prefix for prefix, namespace in cls.NAMESPACES.items()}
+        resource = f"{{{cls.NAMESPACES['RDF']}}}resource"
+
+        for element in ET.parse(source).getroot().iter():
+            namespace, _, name = element.tag.lstrip("{").partition("}")
+
+            if namespace in prefixes and element.get(resource) is not None:
+                rdf.__create_node(f"{prefixes[namespace]}:{name}", element.get(resource))
+
+        return rdf
+
     def __str__(self):
         return ET.tostring(self._xml, encoding="unicode")
 
     def __init_xml(self):
         self._xml = ET.Element("RDF:RDF")
-        self._xml.set("xmlns:MAF", "http://maf.mozdev.org/metadata/rdf#")
-        self._xml.set("xmlns:NC", "http://home.netscape.com/NC-rdf#")
-        self._xml.set("xmlns:RDF", "http://www.w3.org/1999/02/22-rdf-syntax-ns#")
+
+        for prefix, namespace in self.NAMESPACES.items():
+            self._xml.set(f"xmlns:{prefix}", namespace)
 
     def __init_description(self):
         self._description = ET.SubElement(self._xml, "RDF:Description")
@@ -104,6 +741,19 @@ class RDF:
     def charset(self, charset: str):
         self.__update_element("MAF:charset", charset)
 
+    @property
+    def missing_resources(self) -> list:
+        elements = self._description.findall("LW:missingresource")
+        return [element.get("RDF:resource") for element in elements]
+
+    @missing_resources.setter
+    def missing_resources(self, urls: list):
+        for element in self._description.findall("LW:missingresource"):
+            self._description.remove(element)
+
+        for url in urls:
+            self.__create_node("LW:missingresource", url)
+
     def __get_element_value(self, tag: str):
         try:
             element = self.__find_element_by(tag)
@@ -1,2 +1,14 @@
 from .migrate import IndexFileContainer
-from .abstract import MigrationSettings
\ No newline at end of file
+from .abstract import MigrationSettings
+from .register import ResourceRegister
+from .register import SharedResourceRegister
+from .register import EnvelopeRegister
+from .planner import ResourcePlanner
+from .cache import AssetCache
+from .cache import CacheStatistics
+from .container import ResourceKind
+from .policy import ResourcePolicy
+from .policy import PolicyRule
+from .policy import PolicyAction
+from .snapshot import Snapshot
+from .snapshot import Manifest
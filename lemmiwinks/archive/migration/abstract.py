@@ -3,6 +3,8 @@ import logging
 
 import lemmiwinks.taskwrapper as taskwrapper
 
+from . import srcset
+
 
 class BaseMigration(metaclass=abc.ABCMeta):
     @abc.abstractmethod
@@ -20,7 +22,6 @@ class UpdateEntity(metaclass=abc.ABCMeta):
     def __init__(self):
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
-    @taskwrapper.task
     async def update_entity(self, handler, entity, **kwargs):
         try:
             data = self._get_data_from(entity, **kwargs)
@@ -43,13 +44,14 @@ class UpdateEntity(metaclass=abc.ABCMeta):
 
 class BaseProperty(metaclass=abc.ABCMeta):
     def __init__(self, parser, resolver, path_gen,
-                 entity_location, resource_location, recursion_limit):
+                 entity_location, resource_location, recursion_limit, register):
         self.__parser = parser
         self.__resolver = resolver
         self.__path_gen = path_gen
         self.__recursion_limit = recursion_limit
         self.__entity_location = entity_location
         self.__resource_location = resource_location
+        self.__register = register
 
     @property
     def parser(self):
@@ -75,17 +77,31 @@ class BaseProperty(metaclass=abc.ABCMeta):
     def entity_location(self):
         return self.__entity_location
 
+    @property
+    def register(self):
+        return self.__register
+
 
 class BaseEntity(metaclass=abc.ABCMeta):
     def __init__(self, parser, resolver, path_gen,
-                 entity_location, resource_location, recursion_limit):
+                 entity_location, resource_location, recursion_limit, register):
 
         self.__property = BaseProperty(
-            parser, resolver, path_gen, entity_location, resource_location, recursion_limit)
+            parser, resolver, path_gen, entity_location, resource_location,
+            recursion_limit, register)
 
     def __getattr__(self, item):
+        # the entities parse their data asynchronously, the properties
+        # exist once the entity is loaded
+        if item == "_BaseEntity__property":
+            raise AttributeError(f"{self.__class__.__name__} is not loaded yet")
+
         return getattr(self.__property, item)
 
+    @property
+    def loaded(self):
+        return "_BaseEntity__property" in self.__dict__
+
     @abc.abstractmethod
     def migrate_external_sources(self):
         raise NotImplemented()
@@ -96,6 +112,37 @@ class BaseEntity(metaclass=abc.ABCMeta):
 
 
 class MigrationSettings(metaclass=abc.ABCMeta):
+    # optional, the stylesheets are parsed again for every page when not set
+    css_cache = None
+    # optional, the documents are parsed on the event loop when not set
+    parser_pool = None
+    # factory of the srcset.SrcsetPolicy, which selects the one image of the
+    # srcset attributes which is downloaded
+    srcset_policy = srcset.MaxWidthPolicy
+    # bounds the concurrent work of all migrations in the process
+    scheduler = taskwrapper.Scheduler
+    # optional factory of the register.SharedResourceRegister, the cache of
+    # the downloads of all jobs when the asset cache is not set
+    shared_register = None
+    # optional persistent cache of the downloaded assets
+    asset_cache = None
+    # optional time budget of one archive job in seconds, the job exports
+    # whatever was fetched when it expires
+    job_timeout = None
+    # optional time budgets of the single fetch and parse by Stage in seconds
+    stage_timeouts = None
+    # optional factory of the policy.ResourcePolicy, all matched resources
+    # are migrated when not set
+    resource_policy = None
+    # optional factory of the snapshot.Snapshot of the previous archive, the
+    # unchanged resources of its pages are reused by the incremental archiving
+    previous_snapshot = None
+    # optional size in bytes, the downloaded resources up to the size are
+    # inlined to the documents as the data URIs
+    inline_threshold = None
+    # optional recorder of the downloaded responses, e.g. warc.WARCWriter
+    recorder = None
+
     @property
     def html_parser(self):
         raise NotImplemented()
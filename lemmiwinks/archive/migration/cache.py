@@ -0,0 +1,321 @@
+import asyncio
+import atexit
+import collections
+import hashlib
+import json
+import logging
+import os
+import pathlib
+import threading
+import time
+import urllib.parse
+import uuid
+
+import lemmiwinks.httplib as httplib
+import lemmiwinks.pathgen as pathgen
+import lemmiwinks.singleton as singleton
+
+CacheEntry = collections.namedtuple(
+    "CacheEntry", "digest extension size etag last_modified stored")
+
+
+class CacheStatistics:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self):
+        requests = self.hits + self.misses
+        return self.hits / requests if requests else 0.0
+
+    @property
+    def miss_rate(self):
+        requests = self.hits + self.misses
+        return self.misses / requests if requests else 0.0
+
+    def __repr__(self):
+        return (f"{self.__class__.__name__}(hits={self.hits}, misses={self.misses}, "
+                f"revalidations={self.revalidations}, evictions={self.evictions})")
+
+
+class AssetCache(metaclass=singleton.ThreadSafeSingleton):
+    """
+    Persistent cache of the downloaded assets shared by the archive jobs.
+    The entries are keyed by URL and hold the validators of the response,
+    the bodies are stored once by their digest in the content addressed
+    objects directory. The entries younger than max_age are used without a
+    request, the older ones are revalidated by a conditional request. The
+    size of the stored objects is bounded by max_size bytes and the number
+    of the entries by the optional max_entries, the least recently used
+    entries are evicted first. The index is written to the location at
+    exit.
+    """
+
+    INDEX_NAME = "index.json"
+
+    def __init__(self, location, max_size=1024 ** 3, max_age=24 * 60 * 60, max_entries=None):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._location = pathlib.Path(location).resolve()
+        objects_path = self._location.joinpath("objects")
+        objects_path.mkdir(parents=True, exist_ok=True)
+        self._objects = pathgen.ContentAddressedDirectory(str(objects_path))
+
+        self._max_size = max_size
+        self._max_age = max_age
+        self._max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self._references = collections.Counter()
+        self._size = 0
+        self._lock = threading.RLock()
+        self._statistics = CacheStatistics()
+
+        self.__load_index()
+        atexit.register(self.sync)
+
+    @property
+    def statistics(self):
+        return self._statistics
+
+    @property
+    def size(self):
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def lookup(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+
+            if entry is None:
+                return None
+            elif not self.__object_path(entry).exists():
+                self.__remove(url)
+                return None
+
+            self._entries.move_to_end(url)
+            return entry
+
+    def is_fresh(self, entry):
+        return time.time() - entry.stored < self._max_age
+
+    @staticmethod
+    def validators_of(entry):
+        headers = dict()
+
+        if entry is not None and entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry is not None and entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return headers
+
+    def fresh_object(self, url):
+        """
+        Returns the path, the digest and the validator headers of the fresh
+        cached body of the url or None.
+        """
+        entry = self.lookup(url)
+
+        if entry is None or not self.is_fresh(entry):
+            return None
+
+        self.hit()
+        return str(self.__object_path(entry)), entry.digest, self.__headers_of(entry)
+
+    def response_for(self, url, entry, descriptor_budget=None):
+        content_descriptor = open(str(self.__object_path(entry)), "rb")
+        return httplib.Response(content_descriptor, [(url, 200)], self.__headers_of(entry),
+                                descriptor_budget, entry.digest)
+
+    def revalidate(self, url):
+        with self._lock:
+            entry = self._entries.get(url)
+
+            if entry is not None:
+                self._entries[url] = entry._replace(stored=time.time())
+                self._statistics.revalidations += 1
+
+    def put(self, url, response):
+        try:
+            entry = self.__store(url, response)
+        except OSError as e:
+            self.__logger.error(f"Cannot cache {url}: {e}")
+            return
+
+        # the new body is referenced before the old one is released, an
+        # unchanged body is the same object and must not be unlinked
+        with self._lock:
+            previous = self._entries.pop(url, None)
+            self.__add(url, entry)
+            self.__release(previous)
+            self.__evict()
+
+    def hit(self):
+        with self._lock:
+            self._statistics.hits += 1
+
+    def miss(self):
+        with self._lock:
+            self._statistics.misses += 1
+
+    def sync(self):
+        with self._lock:
+            index = {url: entry._asdict() for url, entry in self._entries.items()}
+
+        path = self._location.joinpath(self.INDEX_NAME)
+        temp_path = self._location.joinpath(f"{self.INDEX_NAME}.{uuid.uuid4().hex}")
+
+        try:
+            with open(str(temp_path), "w") as fd:
+                json.dump(index, fd)
+            os.replace(str(temp_path), str(path))
+        except OSError as e:
+            self.__logger.error(f"Cannot write the cache index: {e}")
+
+    def __load_index(self):
+        path = self._location.joinpath(self.INDEX_NAME)
+
+        try:
+            with open(str(path)) as fd:
+                index = json.load(fd)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            self.__logger.error(f"Cannot read the cache index: {e}")
+            return
+
+        for url, entry in index.items():
+            entry = CacheEntry(**entry)
+
+            if self.__object_path(entry).exists():
+                self.__add(url, entry)
+
+        self.__evict()
+
+    def __store(self, url, response):
+        # the body is hashed while it is copied to the objects directory
+        sha256 = hashlib.sha256()
+        source = response.content_descriptor
+        temp_path = self._objects.get_filepath_with("")
+        size = 0
+
+        source.seek(0)
+        with open(str(temp_path), "wb") as fd:
+            for chunk in iter(lambda: source.read(65536), b""):
+                sha256.update(chunk)
+                size += fd.write(chunk)
+        source.seek(0)
+
+        url_path = urllib.parse.urlparse(url).path
+        entry = CacheEntry(sha256.hexdigest(), pathlib.Path(url_path).suffix, size,
+                           response.headers.get("etag"),
+                           response.headers.get("last-modified"),
+                           time.time())
+
+        os.replace(str(temp_path), str(self.__object_path(entry)))
+        return entry
+
+    def __add(self, url, entry):
+        path = self.__object_path(entry)
+
+        if self._references[path] == 0:
+            self._size += entry.size
+
+        self._references[path] += 1
+        self._entries[url] = entry
+
+    def __remove(self, url):
+        self.__release(self._entries.pop(url, None))
+
+    def __release(self, entry):
+        if entry is None:
+            return
+
+        path = self.__object_path(entry)
+        self._references[path] -= 1
+
+        if self._references[path] <= 0:
+            del self._references[path]
+            self._size -= entry.size
+            self.__unlink(path)
+
+    def __evict(self):
+        while self.__is_full() and self._entries:
+            url = next(iter(self._entries))
+            self.__remove(url)
+            self._statistics.evictions += 1
+
+    def __is_full(self):
+        return (self._size > self._max_size or
+                (self._max_entries is not None and len(self._entries) > self._max_entries))
+
+    @staticmethod
+    def __unlink(path):
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+    def __object_path(self, entry):
+        return self._objects.path_of(entry.digest, entry.extension)
+
+    @staticmethod
+    def __headers_of(entry):
+        headers = dict()
+
+        if entry.etag is not None:
+            headers["etag"] = entry.etag
+        if entry.last_modified is not None:
+            headers["last-modified"] = entry.last_modified
+
+        return headers
+
+
+class CachingClient:
+    """
+    Wraps the http client, the GET requests are answered from the asset
+    cache when it holds a fresh or a revalidated body of the URL.
+    """
+
+    def __init__(self, http_client, asset_cache):
+        self.__http_client = http_client
+        self.__cache = asset_cache
+        self.__descriptor_budget = httplib.DescriptorBudget()
+
+    async def get_request(self, url, headers=None):
+        entry = self.__cache.lookup(url)
+
+        if entry is not None and self.__cache.is_fresh(entry):
+            self.__cache.hit()
+            return await self.__cached_response(url, entry)
+
+        validators = self.__cache.validators_of(entry)
+        response = await self.__http_client.get_request(
+            url, headers={**(headers or dict()), **validators} or None)
+
+        if response.status == 304 and entry is not None:
+            response.close()
+            self.__cache.revalidate(url)
+            self.__cache.hit()
+            return await self.__cached_response(url, entry)
+
+        self.__cache.miss()
+
+        if response.status == 200:
+            # the body is copied to the cache off the event loop
+            await asyncio.get_event_loop().run_in_executor(None, self.__cache.put, url, response)
+
+        return response
+
+    async def __cached_response(self, url, entry):
+        await self.__descriptor_budget.acquire()
+
+        try:
+            return self.__cache.response_for(url, entry, self.__descriptor_budget)
+        except BaseException:
+            self.__descriptor_budget.release()
+            raise
@@ -1,3 +1,17 @@
+import enum
+
+
+class ResourceKind(enum.IntEnum):
+    """
+    Kind of the migrated resource. The value is the scheduling priority,
+    the resources which block the export of a document go first.
+    """
+    STYLESHEET = 0
+    DOCUMENT = 1
+    SCRIPT = 2
+    MEDIA = 3
+
+
 class ElementFilterRules:
     __element_sources = {"img": [{"src": True}, {"data-src": True}],
                          "video": [{"src": True}, {"poster": True}],
@@ -7,6 +21,9 @@ class ElementFilterRules:
                          "input": [{"src": True}],
                          "object": [{"data": True}, {"codebase": True}],
                          "track": [{"src": True}]}
+    __srcset_sources = {"img": [{"srcset": True}],
+                        "source": [{"srcset": True}],
+                        "link": [{"imagesrcset": True}]}
     __stylesheet_link = {"link": [{"href": True, "rel": "stylesheet"}]}
     __js_script = {"script": [{"src": True}]}
     __script = {"script": [None]}
@@ -36,6 +53,10 @@ class ElementFilterRules:
     def elements(self):
         return self.__flatten(ElementFilterRules.__element_sources)
 
+    @property
+    def srcset_sources(self):
+        return self.__flatten(ElementFilterRules.__srcset_sources)
+
     @property
     def stylesheet_link(self):
         return self.__flatten(ElementFilterRules.__stylesheet_link)
@@ -64,6 +85,12 @@ class ElementFilterRules:
     def frames(self):
         return self.__flatten(ElementFilterRules.__frames)
 
+    @property
+    def queries(self):
+        return (self.elements + self.srcset_sources + self.stylesheet_link +
+                self.js_script + self.script +
+                self.events + self.style + self.description_style + self.frames)
+
     @staticmethod
     def __flatten(rules):
         flatten_rules = [(element_name, attr_dict) for element_name, attr_list in rules.items()
@@ -85,6 +112,10 @@ class HTMLFilter:
     def elements(self):
         return self.__get_element_list_from(self._filter_rules.elements)
 
+    @property
+    def srcset_sources(self):
+        return self.__get_element_list_from(self._filter_rules.srcset_sources)
+
     @property
     def stylesheet_link(self):
         return self.__get_element_list_from(self._filter_rules.stylesheet_link)
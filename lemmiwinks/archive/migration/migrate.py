@@ -1,20 +1,32 @@
 import asyncio
+import functools
+import html
+import io
 import logging
+import os
+import re
 import urllib.parse
 import pathlib
 
 import dependency_injector.providers as di_provider
 
 import lemmiwinks.httplib as httplib
-import lemmiwinks.singleton as singleton
+import lemmiwinks.pathgen as pathgen
 import lemmiwinks.taskwrapper as taskwrapper
 
 from . import abstract
+from . import cache
 from . import container
+from . import policy
+from . import register
+from . import snapshot
+from . import srcset
 
+DEFAULT_ENCODING = "utf-8"
 
-class SrcRegister(dict, metaclass=singleton.ThreadSafeSingleton):
-    pass
+_BASE_ELEMENT = re.compile(rb"<base\b", re.IGNORECASE)
+_HEAD_ELEMENT = re.compile(rb"<head\b[^>]*>", re.IGNORECASE)
+_HTML_ELEMENT = re.compile(rb"<html\b[^>]*>", re.IGNORECASE)
 
 
 class UpdateTokenValue(abstract.UpdateEntity):
@@ -65,19 +77,79 @@ class UpdateElementAttributeSource(abstract.UpdateEntity):
         entity[kwargs["attr"]] = self.__path_gen.get_relpath_from(data)
 
 
+class UpdateElementAttributeSrcset(abstract.UpdateEntity):
+    """
+    Replaces the srcset attribute by the one candidate selected by the
+    srcset policy. The candidates denied by the optional allows function,
+    such as the one of the policy.PolicyHandler, are not selected. The
+    attribute without any candidate left is blanked.
+    """
+
+    def __init__(self, resolver, path_gen, policy, allows=None):
+        super().__init__()
+        self.__resolver = resolver
+        self.__path_gen = path_gen
+        self.__policy = policy
+        self.__allows = allows
+
+    async def update_entity(self, handler, entity, **kwargs):
+        try:
+            url = self.__select_from(entity[kwargs["attr"]])
+        except Exception as e:
+            self._logger.exception(e)
+            return
+
+        if url is None:
+            entity[kwargs["attr"]] = ""
+        else:
+            await super().update_entity(handler, entity, url=url, **kwargs)
+
+    def __select_from(self, value):
+        candidates = list()
+
+        for candidate in srcset.parse_srcset(value or ""):
+            try:
+                url = self.__resolver.resolve(candidate.url)
+            except httplib.exception.URLResolverError:
+                continue
+
+            if self.__allows is None or self.__allows(url):
+                candidates.append(candidate._replace(url=url))
+
+        candidate = self.__policy.select(candidates)
+        return None if candidate is None else candidate.url
+
+    def _get_data_from(self, entity, **kwargs):
+        return kwargs["url"]
+
+    def _update_entity(self, data, entity, **kwargs):
+        entity[kwargs["attr"]] = self.__path_gen.get_relpath_from(data)
+
+
 class DownloadHandler(abstract.DataHandler):
-    def __init__(self, entity_property, settings):
+    """
+    Downloads the resource and stores its body to the sink of the job.
+    The body is stored from the file of the response or the asset cache,
+    so it is not copied through the temporary file.
+    """
+
+    def __init__(self, entity_property, settings, kind=container.ResourceKind.MEDIA):
         self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
-        self.__downloader = httplib.provider.HTTPClientDownloader(settings.http_client())
+        self.__kind = kind
+        self.__src_register = entity_property.register
+        self.__asset_cache = _init_asset_cache(settings, self.__src_register)
+        self.__http_client = _init_snapshot_client(
+            _init_http_client(settings, self.__asset_cache), self.__src_register)
+        self.__scheduler = settings.scheduler()
         self.__path_gen = entity_property.path_gen
-        self.__src_register = SrcRegister()
+        self.__inline_threshold = settings.inline_threshold
 
     async def process(self, url):
         try:
             if url not in self.__src_register.keys():
                 await self.__download(url)
 
-            path = self.__src_register.get(url)
+            path = await self.__src_register.get_resolved(url)
         except Exception as e:
             self.__log_error(e=e, url=url)
             return ""
@@ -89,17 +161,123 @@ class DownloadHandler(abstract.DataHandler):
         self.__logger.exception(kwargs["e"])
 
     async def __download(self, url):
+        reserved = self.__reserve_path_for_url(url)
+        # the resource which was not stored keeps its absolute URL, so the
+        # parents do not refer to the reserved path which was never written
+        path = url
+
         try:
-            self.__register_path_for_url(url)
-            path = self.__src_register.get(url)
-            await self.__downloader.download(url, path)
+            path = await self.__download_to(url, reserved)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            # nothing is stored before the body is complete, so the
+            # resource is reported as missing
+            self.__logger.error(f"download of {url} was stopped by the deadline")
+
+            if isinstance(e, asyncio.CancelledError):
+                raise
+        except httplib.exception.HTTPClientConnectionFailed as e:
+            self.__logger.error(f"download of {url} failed: {e}")
         except Exception as e:
             self.__log_error(e=e, url=url)
+        finally:
+            self.__src_register.resolve(url, path)
+
+    async def __download_to(self, url, path):
+        stored = await self.__envelope_object(url)
+
+        if stored is not None:
+            return self.__record(url, *stored)
+
+        try:
+            return await self.__store_from_source(url, path)
+        finally:
+            self.__release_envelope(url)
+
+    async def __store_from_source(self, url, path):
+        cached = self.__cached_object(url)
+
+        if cached is not None:
+            return self.__store(url, path, *cached)
+
+        priority = self.__src_register.priority_of(self.__kind)
+
+        async with self.__scheduler.slot(taskwrapper.Stage.FETCH, priority):
+            response = await self.__src_register.deadline.wait_for(
+                self.__http_client.get_request(url), taskwrapper.Stage.FETCH)
 
-    def __register_path_for_url(self, url):
+        with response:
+            source = response.content_descriptor.name
+            digest = response.digest or pathgen.file_digest(source)
+
+            return self.__store(url, path, source, digest, response.headers, response.status)
+
+    def __store(self, url, path, source, digest, headers=None, status=None):
+        envelope = self.__src_register.envelope
+
+        if self.__is_inlined(source):
+            # the small resource is written to the document as the data URI
+            path = pathgen.data_uri_from(source, url)
+
+            if envelope is not None:
+                envelope.add(url, path, digest, headers)
+
+            return path
+
+        path = self.__path_gen.content_path(path, digest)
+        sink = self.__src_register.sink
+
+        if envelope is not None and envelope.path_of(digest) is not None:
+            # the same content is stored by other tab of the archive
+            path = envelope.path_of(digest)
+        elif not sink.exists(path):
+            # the content addressed path may be stored by other URL already
+            sink.store(path, source)
+
+        if envelope is not None:
+            envelope.add(url, path, digest, headers)
+
+        return self.__record(url, path, digest, headers, status)
+
+    def __record(self, url, path, digest, headers=None, status=None):
+        # the validators of the file are recorded whether it was downloaded,
+        # cached or stored by other tab
+        self.__src_register.record(url, path, headers, status, digest)
+        return path
+
+    def __is_inlined(self, source):
+        return (self.__inline_threshold is not None
+                and os.path.getsize(source) <= self.__inline_threshold)
+
+    async def __envelope_object(self, url):
+        # the URL is downloaded by the first tab of the archive which
+        # reserves it, the other tabs wait for its file
+        envelope = self.__src_register.envelope
+
+        while envelope is not None and not envelope.reserve(url):
+            stored = await envelope.get_stored(url)
+
+            if stored is not None:
+                return stored
+
+        return None
+
+    def __release_envelope(self, url):
+        envelope = self.__src_register.envelope
+
+        if envelope is not None:
+            envelope.release(url)
+
+    def __cached_object(self, url):
+        if self.__asset_cache is None:
+            return None
+        else:
+            return self.__asset_cache.fresh_object(url)
+
+    def __reserve_path_for_url(self, url):
         url_path = urllib.parse.urlparse(url).path
         path = self.__path_gen.generate_filepath_with(pathlib.Path(url_path).suffix)
-        self.__src_register.update({url: path})
+        self.__src_register.reserve(url, path)
+        return path
 
 
 class _RecursiveEntityHandler(abstract.DataHandler):
@@ -113,33 +291,106 @@ class _RecursiveEntityHandler(abstract.DataHandler):
     on server specified by url. It returns response object.
 
     The _register_path_for(self, url) method generate filepath for new
-    resources with file extension. the url and path are added to src_register
-    dictionary.
+    resources with file extension. the url and path are added to the register
+    of the archive job.
 
     The _process_entity_recursively_from(self, response) contains of recursive
     call of CSS or HTML migration.
+
+    When the register has a planner, the migration of the entity is started
+    in the task of its own one level deeper in the resource graph and only
+    the registered path is returned. Without the planner it is migrated in
+    the task of its parent, one level deeper while it is migrated, so the
+    depth limits of the policy apply either way. The entity reserved by
+    other tab of the archive is referred by the path reserved by that tab,
+    it is not migrated again.
+
+    The entity which is not written is registered by its absolute URL. The
+    path referred by the planned parents or the other tabs gets the document
+    of the _forward_to(self, url) method, which refers to the absolute URL.
     """
 
-    def __init__(self, recursion_limit):
+    def __init__(self, recursion_limit, src_register, scheduler, kind):
         self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
 
         self._recursion_limit = recursion_limit
-        self._src_register = SrcRegister()
+        self._src_register = src_register
+        self.__scheduler = scheduler
+        self.__kind = kind
 
     async def process(self, url):
         try:
             if url not in self._src_register.keys():
-                await self.__migrate_entity_from(url)
+                self._register_path_for(url)
+                reserved = self.__reserve_envelope_for(url)
+
+                if reserved is not False:
+                    await self.__plan_entity_from(url, reserved)
         except Exception as e:
             self.__log_error(e=e, url=url)
         finally:
             return self._src_register.get(url)
 
-    async def __migrate_entity_from(self, url):
-        self._register_path_for(url)
-        response = await self._get_response_from(url)
-        self._update_path_for(url, response.accessed_url, response.requested_url)
-        await self.__process_response(response)
+    def __reserve_envelope_for(self, url):
+        # returns None without the envelope and False when the entity is
+        # referred by the path reserved by other tab
+        envelope = self._src_register.envelope
+
+        if envelope is None:
+            return None
+        elif envelope.reserve(url, self._src_register.get(url)):
+            return True
+
+        path = envelope.reserved_path_of(url)
+
+        if path is None:
+            # the URL is downloaded by other tab, it has no reserved path
+            return None
+
+        self._src_register.update({url: path})
+        return False
+
+    async def __plan_entity_from(self, url, reserved):
+        planner = self._src_register.planner
+        job = functools.partial(self.__migrate_entity_from, url, reserved)
+
+        if planner is None:
+            # the depth is checked by the policy of the nested resources
+            with self._src_register.deeper():
+                await job()
+        else:
+            planner.schedule(self.__kind, functools.partial(self.__migrate_planned_entity, job, url))
+
+    async def __migrate_planned_entity(self, job, url):
+        try:
+            await job()
+        except asyncio.TimeoutError:
+            self.__logger.error(f"migration of {url} was stopped by the deadline")
+        except Exception as e:
+            self.__log_error(e=e, url=url)
+
+    async def __migrate_entity_from(self, url, reserved):
+        path = self._src_register.get(url)
+
+        try:
+            await self.__fetch_and_process(url)
+        except BaseException:
+            self.__forward_unwritten(url, path, reserved)
+            raise
+        finally:
+            if reserved:
+                self._src_register.envelope.add(url, path)
+
+    async def __fetch_and_process(self, url):
+        priority = self._src_register.priority_of(self.__kind)
+
+        async with self.__scheduler.slot(taskwrapper.Stage.FETCH, priority):
+            response = await self._src_register.deadline.wait_for(
+                self._get_response_from(url), taskwrapper.Stage.FETCH)
+
+        with response:
+            self._update_path_for(url, response.accessed_url, response.requested_url)
+            await self.__process_response(response)
 
     def __log_error(self, **kwargs):
         self.__logger.exception(kwargs["e"])
@@ -149,6 +400,28 @@ class _RecursiveEntityHandler(abstract.DataHandler):
     def _register_path_for(self, url):
         raise NotImplemented
 
+    def __forward_unwritten(self, url, path, reserved):
+        sink = self._src_register.sink
+
+        if not path or sink.exists(path):
+            return
+
+        for key, value in list(self._src_register.items()):
+            if value == path:
+                self._src_register.update({key: key})
+
+        if self._src_register.planner is None and not reserved:
+            return
+
+        try:
+            with sink.open(path, "wb") as fd:
+                fd.write(self._forward_to(url).encode(DEFAULT_ENCODING))
+        except OSError as e:
+            self.__logger.error(f"Cannot write {path}: {e}")
+
+    def _forward_to(self, url):
+        raise NotImplemented
+
     def _update_path_for(self, urlkey, accessed_url, requested_url):
         path = self._src_register.get(urlkey)
         self._src_register.update({accessed_url: path})
@@ -170,14 +443,18 @@ class _RecursiveEntityHandler(abstract.DataHandler):
         url = response.requested_url
         path = self._src_register.get(url)
 
-        with open(path, "wb") as fd:
-            fd.write(response.content_descriptor.read())
+        response.content_descriptor.flush()
+        self._src_register.sink.store(path, response.content_descriptor.name)
+        self._src_register.record(url, path, response.headers, response.status)
 
 
 class CSSFileHandler(_RecursiveEntityHandler):
     def __init__(self, entity_property, settings):
-        super().__init__(entity_property.recursion_limit)
-        self.__client = settings.http_client()
+        super().__init__(entity_property.recursion_limit, entity_property.register,
+                         settings.scheduler(), container.ResourceKind.STYLESHEET)
+        self.__client = _init_snapshot_client(
+            _init_http_client(settings, _init_asset_cache(settings, entity_property.register)),
+            entity_property.register)
         self.__path_gen = entity_property.path_gen
         self.__settings = settings
 
@@ -185,6 +462,9 @@ class CSSFileHandler(_RecursiveEntityHandler):
         path = self.__path_gen.generate_filepath_with(".css")
         self._src_register.update({url: path})
 
+    def _forward_to(self, url):
+        return '@import url("{}");\n'.format(url.replace('"', "%22"))
+
     async def _get_response_from(self, url):
         return await self.__client.get_request(url)
 
@@ -192,26 +472,38 @@ class CSSFileHandler(_RecursiveEntityHandler):
         url = response.requested_url
         path = self._src_register.get(url)
 
-        css_file = CssFile(response, path,
-                           self.__settings, self._recursion_limit - 1)
+        css_file = CssFile(response, path, self.__settings,
+                           self._recursion_limit - 1, self._src_register)
 
-        await css_file.migrate_external_sources()
-        css_file.export()
+        try:
+            await css_file.migrate_external_sources()
+        except (asyncio.TimeoutError, asyncio.CancelledError):
+            # the stylesheet stopped by the deadline is written with the
+            # tokens resolved so far
+            css_file.export_resolved()
+            raise
+
+        await css_file.export()
 
 
 class _HTMLEntityHandler(_RecursiveEntityHandler):
-    def __init__(self, entity_property):
-        super().__init__(entity_property.recursion_limit)
+    def __init__(self, entity_property, settings):
+        super().__init__(entity_property.recursion_limit, entity_property.register,
+                         settings.scheduler(), container.ResourceKind.DOCUMENT)
         self.__path_gen = entity_property.path_gen
 
     def _register_path_for(self, url):
         path = self.__path_gen.generate_filepath_with(".html")
         self._src_register.update({url: path})
 
+    def _forward_to(self, url):
+        return ('<!DOCTYPE html>\n<meta http-equiv="refresh" content="0; url={}">\n'
+                .format(html.escape(url)))
+
 
 class HTMLFileWithJsExecutionHandler(_HTMLEntityHandler):
     def __init__(self, entity_property, settings):
-        super().__init__(entity_property)
+        super().__init__(entity_property, settings)
         self.__http_js_pool = settings.http_js_pool()
         self.__resource_location = entity_property.resource_location
         self.__settings = settings
@@ -231,16 +523,18 @@ class HTMLFileWithJsExecutionHandler(_HTMLEntityHandler):
             filepath=path,
             res_location=self.__resource_location,
             settings=self.__settings,
-            recursion_limit=self._recursion_limit)
+            recursion_limit=self._recursion_limit,
+            register=self._src_register)
 
         await index_file.migrate_external_sources()
-        index_file.export()
+        await index_file.export()
 
 
 class HTMLFileHandler(_HTMLEntityHandler):
     def __init__(self, entity_property, settings):
-        super().__init__(entity_property)
-        self.__client = settings.http_client()
+        super().__init__(entity_property, settings)
+        self.__client = _init_snapshot_client(
+            _init_http_client(settings, asset_cache=None), entity_property.register)
         self.__resource_location = entity_property.resource_location
         self.__settings = settings
 
@@ -256,10 +550,11 @@ class HTMLFileHandler(_HTMLEntityHandler):
             filepath=path,
             res_location=self.__resource_location,
             settings=self.__settings,
-            recursion_limit=self._recursion_limit)
+            recursion_limit=self._recursion_limit,
+            register=self._src_register)
 
         await index_file.migrate_external_sources()
-        index_file.export()
+        await index_file.export()
 
 
 class CssStyleHandler(abstract.DataHandler):
@@ -268,34 +563,83 @@ class CssStyleHandler(abstract.DataHandler):
         self.__style_location = entity_property.entity_location
         self.__resource_location = entity_property.resource_location
         self.__recursion_limit = entity_property.recursion_limit
+        self.__register = entity_property.register
         self.__settings = settings
 
     async def process(self, data):
         css_style = CSSStyle(data, self.__url, self.__style_location,
                              self.__resource_location, self.__settings,
-                             self.__recursion_limit)
+                             self.__recursion_limit, self.__register)
 
         await css_style.migrate_external_sources()
 
-        return css_style.export()
+        return await css_style.export()
+
 
+class CssDeclarationBatchHandler(abstract.DataHandler):
+    """
+    Migrates the style attributes of all elements of a document in one pass.
+    Only the declarations that contain url() are parsed, the tokens of all
+    of them are resolved by one shared token task container and the new
+    declarations are written back to the elements afterwards.
+    """
 
-class CssDeclarationHandler(abstract.DataHandler):
     def __init__(self, entity_property, settings):
-        self.__url = entity_property.resolver.base
-        self.__declaration_location = entity_property.entity_location
-        self.__resource_location = entity_property.resource_location
-        self.__recursion_limit = entity_property.recursion_limit
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.__settings = settings
+        self.__scheduler = settings.scheduler()
+        self.__task = TokenTaskContainer(entity_property, settings)
 
     async def process(self, data):
-        css_declaration = CSSDeclaration(data, self.__url, self.__declaration_location,
-                                         self.__resource_location, self.__settings,
-                                         self.__recursion_limit)
+        declarations = await self.__parse_declarations_from(data)
+
+        await self.__scheduler.gather(
+            self.__task.update_url_token(token)
+            for _, _, parser in declarations for token in parser.url_tokens)
+        await self.__scheduler.gather(
+            self.__task.update_import_token(token)
+            for _, _, parser in declarations for token in parser.import_tokens)
+
+        for element, attr, parser in declarations:
+            element[attr] = parser.export()
 
-        await css_declaration.migrate_external_sources()
+    async def __parse_declarations_from(self, elements):
+        elements = [(element, attr) for element, attr in elements
+                    if self.__has_url(element[attr])]
+
+        try:
+            parsers = await self.__parse([element[attr] for element, attr in elements])
+        except Exception as e:
+            self.__logger.exception(e)
+            return list()
 
-        return css_declaration.export()
+        return [(element, attr, parser)
+                for (element, attr), parser in zip(elements, parsers)
+                if parser is not None and (parser.url_tokens or parser.import_tokens)]
+
+    @staticmethod
+    def __has_url(value):
+        return bool(value) and "url(" in value.lower()
+
+    async def __parse(self, data_list):
+        if self.__settings.parser_pool is None:
+            return [self.__parse_declaration(data) for data in data_list]
+        else:
+            return await self.__settings.parser_pool().css_parsers(
+                data_list, declaration=True)
+
+    def __parse_declaration(self, data):
+        # the declaration which cannot be parsed is left as it is
+        try:
+            parser = self.__settings.css_parser(data, declaration=True)
+
+            if parser is not None:
+                parser.parse_tokens()
+        except Exception as e:
+            self.__logger.error(f"Cannot parse the declaration {data!r}: {e}")
+            return None
+        else:
+            return parser
 
 
 class JSFileHandler(abstract.DataHandler):
@@ -322,16 +666,29 @@ class _BaseElementTaskContainer:
         self._element_attr_updater = UpdateElementAttribute()
         self._element_src_attr_updater = UpdateElementAttributeSource(
             entity_property.resolver, entity_property.path_gen)
-
-        self._download_source = DownloadHandler(entity_property, settings)
-        self._css_file_handler = CSSFileHandler(entity_property, settings)
+        self._download_source = _apply_policy(
+            DownloadHandler(entity_property, settings),
+            container.ResourceKind.MEDIA, entity_property, settings)
+        self._element_srcset_attr_updater = UpdateElementAttributeSrcset(
+            entity_property.resolver, entity_property.path_gen, settings.srcset_policy(),
+            _allows_of(self._download_source))
+        self._download_script = _apply_policy(
+            DownloadHandler(entity_property, settings, container.ResourceKind.SCRIPT),
+            container.ResourceKind.SCRIPT, entity_property, settings)
+        self._css_file_handler = _apply_policy(
+            CSSFileHandler(entity_property, settings),
+            container.ResourceKind.STYLESHEET, entity_property, settings)
         self._css_style_handler = CssStyleHandler(entity_property, settings)
-        self._css_declaration_handler = CssDeclarationHandler(entity_property, settings)
+        self._css_declaration_handler = CssDeclarationBatchHandler(entity_property, settings)
 
     def update_source_attr(self, element, attr):
         return self._element_src_attr_updater.update_entity(
             self._download_source, element, attr=attr)
 
+    def update_srcset_attr(self, element, attr):
+        return self._element_srcset_attr_updater.update_entity(
+            self._download_source, element, attr=attr)
+
     def update_link_stylesheet_ref(self, element, attr):
         return self._element_src_attr_updater.update_entity(
             self._css_file_handler, element, attr=attr)
@@ -340,16 +697,21 @@ class _BaseElementTaskContainer:
         return self._element_string_updater.update_entity(
             self._css_style_handler, element)
 
-    def update_css_declaration(self, element, attr):
-        return self._element_attr_updater.update_entity(
-            self._css_declaration_handler, element, attr=attr)
+    def update_css_declarations(self, elements):
+        return self._css_declaration_handler.process(elements)
 
 
 class ElementTaskContainer(_BaseElementTaskContainer):
     def __init__(self, entity_property, settings):
         super().__init__(entity_property, settings)
 
-        self._html_file_handler = HTMLFileHandler(entity_property, settings)
+        self._html_file_handler = _apply_policy(
+            HTMLFileHandler(entity_property, settings),
+            container.ResourceKind.DOCUMENT, entity_property, settings)
+
+    def update_script_source(self, element, attr):
+        return self._element_src_attr_updater.update_entity(
+            self._download_script, element, attr=attr)
 
     def update_iframe_source(self, element, attr):
         return self._element_src_attr_updater.update_entity(
@@ -362,7 +724,9 @@ class ElementTaskContainerWithJsExecution(_BaseElementTaskContainer):
 
         self._js_file_handler = JSFileHandler(entity_property)
         self._inline_js_handler = InlineJSHandler()
-        self._html_file_handler = HTMLFileWithJsExecutionHandler(entity_property, settings)
+        self._html_file_handler = _apply_policy(
+            HTMLFileWithJsExecutionHandler(entity_property, settings),
+            container.ResourceKind.DOCUMENT, entity_property, settings)
 
     def update_script_source(self, element, attr):
         return self._element_src_attr_updater.update_entity(
@@ -386,8 +750,12 @@ class TokenTaskContainer:
         self.__token_value_updater = UpdateTokenValue(
             entity_property.resolver, entity_property.path_gen)
 
-        self.__download_token = DownloadHandler(entity_property, settings)
-        self.__css_file_handler = CSSFileHandler(entity_property, settings)
+        self.__download_token = _apply_policy(
+            DownloadHandler(entity_property, settings),
+            container.ResourceKind.MEDIA, entity_property, settings)
+        self.__css_file_handler = _apply_policy(
+            CSSFileHandler(entity_property, settings),
+            container.ResourceKind.STYLESHEET, entity_property, settings)
 
     def update_url_token(self, token):
         return self.__token_value_updater.update_entity(self.__download_token, token)
@@ -399,94 +767,79 @@ class TokenTaskContainer:
 class CSSMigration(abstract.BaseMigration):
     def __init__(self, css_entity, settings: abstract.MigrationSettings):
         self.__css_entity = css_entity
+        self.__scheduler = settings.scheduler()
         self.__task = TokenTaskContainer(css_entity, settings)
 
     async def migrate(self):
         await asyncio.gather(self.__update_url_tokens(),
                              self.__update_import_tokens())
 
-    @taskwrapper.task
     async def __update_url_tokens(self):
-        tasks = [self.__task.update_url_token(token)
-                 for token in self.__css_entity.parser.url_tokens]
-        await asyncio.gather(*tasks)
+        await self.__scheduler.gather(self.__task.update_url_token(token)
+                                      for token in self.__css_entity.parser.url_tokens)
 
-    @taskwrapper.task
     async def __update_import_tokens(self):
-        tasks = [self.__task.update_import_token(token)
-                 for token in self.__css_entity.parser.import_tokens]
-        await asyncio.gather(*tasks)
+        await self.__scheduler.gather(self.__task.update_import_token(token)
+                                      for token in self.__css_entity.parser.import_tokens)
 
 
 class _BaseHTMLMigration:
-    def __init__(self, index_entity, task):
+    def __init__(self, index_entity, task, settings):
         self._html_filter = container.HTMLFilter(index_entity.parser)
+        self._scheduler = settings.scheduler()
         self._task = task
 
-    @taskwrapper.task
     async def _migrate_html_elements_sources(self):
-        tasks = [self._task.update_source_attr(element, attr)
-                 for element, attr in self._html_filter.elements]
+        await self._scheduler.gather(self._task.update_source_attr(element, attr)
+                                     for element, attr in self._html_filter.elements)
 
-        await asyncio.gather(*tasks)
+    async def _migrate_srcset_sources(self):
+        await self._scheduler.gather(self._task.update_srcset_attr(element, attr)
+                                     for element, attr in self._html_filter.srcset_sources)
 
-    @taskwrapper.task
     async def _migrate_css_file(self):
-        tasks = [self._task.update_link_stylesheet_ref(element, attr)
-                 for element, attr in self._html_filter.stylesheet_link]
+        await self._scheduler.gather(self._task.update_link_stylesheet_ref(element, attr)
+                                     for element, attr in self._html_filter.stylesheet_link)
 
-        await asyncio.gather(*tasks)
-
-    @taskwrapper.task
     async def _migrate_css_style(self):
-        tasks = [self._task.update_css_style(element)
-                 for element, _ in self._html_filter.style]
-
-        await asyncio.gather(*tasks)
+        await self._scheduler.gather(self._task.update_css_style(element)
+                                     for element, _ in self._html_filter.style)
 
-    @taskwrapper.task
     async def _migrate_css_declaration(self):
-        tasks = [self._task.update_css_declaration(element, attr)
-                 for element, attr in self._html_filter.description_style]
-
-        await asyncio.gather(*tasks)
+        await self._task.update_css_declarations(self._html_filter.description_style)
 
-    @taskwrapper.task
     async def _migrate_iframes(self):
-        tasks = [self._task.update_iframe_source(element, attr)
-                 for element, attr in self._html_filter.frames]
-
-        await asyncio.gather(*tasks)
+        await self._scheduler.gather(self._task.update_iframe_source(element, attr)
+                                     for element, attr in self._html_filter.frames)
 
 
 class HTMLMigration(_BaseHTMLMigration, abstract.BaseMigration):
     def __init__(self, index_entity, settings):
         task = ElementTaskContainer(index_entity, settings)
-        super().__init__(index_entity, task)
+        super().__init__(index_entity, task, settings)
 
     async def migrate(self):
         await asyncio.gather(self._migrate_html_elements_sources(),
+                             self._migrate_srcset_sources(),
                              self._migrate_css_file(),
                              self._migrate_css_style(),
                              self._migrate_css_declaration(),
                              self._migrate_script_source(),
                              self._migrate_iframes())
 
-    @taskwrapper.task
     async def _migrate_script_source(self):
-        tasks = [self._task.update_source_attr(element, attr)
-                 for element, attr in self._html_filter.js_script]
-
-        await asyncio.gather(*tasks)
+        await self._scheduler.gather(self._task.update_script_source(element, attr)
+                                     for element, attr in self._html_filter.js_script)
 
 
 class HTMLMigrationWithJSExecution(_BaseHTMLMigration, abstract.BaseMigration):
     def __init__(self, index_entity, settings):
         task = ElementTaskContainerWithJsExecution(index_entity, settings)
-        super().__init__(index_entity, task)
+        super().__init__(index_entity, task, settings)
 
     async def migrate(self):
         await asyncio.gather(self._migrate_html_elements_sources(),
+                             self._migrate_srcset_sources(),
                              self._migrate_css_file(),
                              self._migrate_css_style(),
                              self._migrate_css_declaration(),
@@ -495,127 +848,357 @@ class HTMLMigrationWithJSExecution(_BaseHTMLMigration, abstract.BaseMigration):
                              self._migrate_inline_script(),
                              self._migrate_iframes())
 
-    @taskwrapper.task
     async def _migrate_script_source(self):
-        tasks = [self._task.update_script_source(element, attr)
-                 for element, attr in self._html_filter.js_script]
-
-        await asyncio.gather(*tasks)
+        await self._scheduler.gather(self._task.update_script_source(element, attr)
+                                     for element, attr in self._html_filter.js_script)
 
-    @taskwrapper.task
     async def _migrate_js_events(self):
-        tasks = [self._task.update_event_attr(element, attr)
-                 for element, attr in self._html_filter.elements_event]
+        await self._scheduler.gather(self._task.update_event_attr(element, attr)
+                                     for element, attr in self._html_filter.elements_event)
 
-        await asyncio.gather(*tasks)
-
-    @taskwrapper.task
     async def _migrate_inline_script(self):
-        tasks = [self._task.update_inline_script(element)
-                 for element, _ in self._html_filter.script]
-
-        await asyncio.gather(*tasks)
+        await self._scheduler.gather(self._task.update_inline_script(element)
+                                     for element, _ in self._html_filter.script)
 
 
 class CssFile(abstract.BaseEntity):
-    def __init__(self, response, filepath, settings, recursion_limit=3):
+    def __init__(self, response, filepath, settings, recursion_limit=3, register=None):
         self._filepath = filepath
+        self._settings = settings
+        self._response = response
+        self._recursion_limit = recursion_limit
+        self._register = _init_register(register)
+        self._css_migration = None
+        self._sources = list()
 
-        parser = settings.css_parser(response.content_descriptor)
-        parser.parse_tokens()
+    async def __load(self):
+        resolver = self._settings.resolver(self._response.accessed_url)
 
-        resolver = settings.resolver(response.accessed_url)
-        essential_location = pathlib.Path(filepath).parent
-        path_gen = settings.path_gen(essential_location, essential_location)
+        async with self._settings.scheduler().slot(taskwrapper.Stage.PARSE):
+            parser = await self._register.deadline.wait_for(
+                self.__get_parser_for(self._response, resolver.base), taskwrapper.Stage.PARSE)
 
-        super().__init__(parser, resolver, path_gen, essential_location,
-                         essential_location, recursion_limit)
+        # the body is not needed after the parse
+        self._response.close()
 
-        self._css_migration = CSSMigration(self, settings)
+        essential_location = pathlib.Path(self._filepath).parent
+        path_gen = self._settings.path_gen(essential_location, essential_location)
 
-    async def migrate_external_sources(self):
-        await self._css_migration.migrate()
+        super().__init__(parser, resolver, path_gen, essential_location,
+                         essential_location, self._recursion_limit, self._register)
 
-    def export(self):
-        with open(self._filepath, "w") as fd:
-            fd.write(self.parser.export())
+        self._sources = [(token, token.value)
+                         for token in parser.url_tokens + parser.import_tokens]
+        self._css_migration = CSSMigration(self, self._settings)
 
+    async def __get_parser_for(self, response, url):
+        content = response.content_descriptor.read()
+        response.content_descriptor.seek(0)
 
-class CSSStyle(abstract.BaseEntity):
-    def __init__(self, data, url, style_location, resource_location,
-                 settings, recursion_limit=3):
-        parser = settings.css_parser(data)
-        parser.parse_tokens()
+        if self._settings.css_cache is None:
+            return await self.__parse(content)
 
-        resolver = settings.resolver(url)
-        path_gen = settings.path_gen(resource_location, style_location)
+        stylesheet_cache = self._settings.css_cache()
+        parser = stylesheet_cache.get(content, url)
 
-        super().__init__(parser, resolver, path_gen, style_location,
-                         resource_location, recursion_limit)
+        if parser is None:
+            parser = await self.__parse(content)
+            stylesheet_cache.put(content, url, parser.template())
 
-        self._css_migration = CSSMigration(self, settings)
+        return parser
+
+    async def __parse(self, content):
+        if self._settings.parser_pool is None:
+            parser = self._settings.css_parser(io.BytesIO(content))
+            parser.parse_tokens()
+            return parser
+        else:
+            return await self._settings.parser_pool().css_parser(content)
 
     async def migrate_external_sources(self):
+        await self.__load()
         await self._css_migration.migrate()
 
-    def export(self):
-        return self.parser.export()
+    async def export(self):
+        async with self._settings.scheduler().slot(taskwrapper.Stage.WRITE):
+            self.export_resolved()
+
+    def export_resolved(self):
+        """
+        Writes the stylesheet without waiting for the write slot, so it is
+        written by the migration stopped by the deadline too. The tokens
+        which were not migrated refer to their absolute URLs, the body is
+        written as it is when it was not parsed.
+        """
+        if self.loaded:
+            self.__absolutize_unresolved_tokens()
+            data = self.parser.export().encode(DEFAULT_ENCODING)
+        else:
+            self._response.content_descriptor.seek(0)
+            data = self._response.content_descriptor.read()
 
+        with self._register.sink.open(self._filepath, "wb") as fd:
+            fd.write(data)
 
-class CSSDeclaration(abstract.BaseEntity):
-    def __init__(self, data, url, declaration_location, resource_location,
-                 settings, recursion_limit=3):
-        parser = settings.css_parser(data, declaration=True)
-        parser.parse_tokens()
+        self._register.record(self._response.requested_url, self._filepath,
+                              self._response.headers, self._response.status, mime="text/css")
+
+    def __absolutize_unresolved_tokens(self):
+        for token, source in self._sources:
+            if token.value == source:
+                token.value = urllib.parse.urljoin(self.resolver.base, source)
+
+
+class CSSStyle(abstract.BaseEntity):
+    def __init__(self, data, url, style_location, resource_location,
+                 settings, recursion_limit=3, register=None):
+        self._data = data
+        self._url = url
+        self._style_location = style_location
+        self._resource_location = resource_location
+        self._settings = settings
+        self._recursion_limit = recursion_limit
+        self._register = _init_register(register)
+        self._css_migration = None
 
-        resolver = settings.resolver(url)
-        path_gen = settings.path_gen(resource_location, declaration_location)
+    async def __load(self):
+        async with self._settings.scheduler().slot(taskwrapper.Stage.PARSE):
+            parser = await self._register.deadline.wait_for(
+                self.__parse(self._data), taskwrapper.Stage.PARSE)
 
-        super().__init__(parser, resolver, path_gen, declaration_location,
-                         resource_location, recursion_limit)
+        resolver = self._settings.resolver(self._url)
+        path_gen = self._settings.path_gen(self._resource_location, self._style_location)
 
-        self._css_migration = CSSMigration(self, settings)
+        super().__init__(parser, resolver, path_gen, self._style_location,
+                         self._resource_location, self._recursion_limit, self._register)
+
+        self._css_migration = CSSMigration(self, self._settings)
+
+    async def __parse(self, data):
+        if self._settings.parser_pool is None:
+            parser = self._settings.css_parser(data)
+            parser.parse_tokens()
+            return parser
+        else:
+            return await self._settings.parser_pool().css_parser(str(data))
 
     async def migrate_external_sources(self):
+        await self.__load()
         await self._css_migration.migrate()
 
-    def export(self):
+    async def export(self):
         return self.parser.export()
 
 
 class IndexFile(abstract.BaseEntity):
-    def __init__(self, response, filepath, res_location, settings, migration, recursion_limit=3):
+    def __init__(self, response, filepath, res_location, settings, migration,
+                 recursion_limit=3, register=None):
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self._filepath = filepath
         self._settings = settings
-        self.__parser = settings.html_parser(response.content_descriptor)
+        self._response = response
+        self._res_location = res_location
+        self._migration = migration
+        self._recursion_limit = recursion_limit
+        self._register = _init_register(register)
+        self._html_migration = None
+        self._sources = list()
+
+    async def __load(self):
+        async with self._settings.scheduler().slot(taskwrapper.Stage.PARSE):
+            parser = await self._register.deadline.wait_for(
+                self.__parse(self._response), taskwrapper.Stage.PARSE)
+
+        # the body is not needed after the parse
+        self._response.close()
 
-        index_location = pathlib.Path(filepath).parent
-        resolver = self.__init_resolver(response.accessed_url)
-        path_gen = settings.path_gen(res_location, index_location)
+        index_location = pathlib.Path(self._filepath).parent
+        resolver = self.__init_resolver(parser, self._response.accessed_url)
+        path_gen = self._settings.path_gen(self._res_location, index_location)
 
-        super().__init__(self.__parser, resolver, path_gen,
-                         index_location, res_location, recursion_limit)
+        super().__init__(parser, resolver, path_gen, index_location,
+                         self._res_location, self._recursion_limit, self._register)
 
-        self._html_migration = migration(self, settings)
+        self._html_migration = self._migration(self, self._settings)
+        self._sources = self.__sources_of(parser)
         del self.parser.base
 
-    def __init_resolver(self, url):
+    async def __parse(self, response):
+        if self._settings.parser_pool is None:
+            return self._settings.html_parser(response.content_descriptor)
+        else:
+            queries = container.ElementFilterRules().queries
+            return await self._settings.parser_pool().html_parser(
+                response.content_descriptor.read(), queries)
+
+    def __sources_of(self, parser):
+        html_filter = container.HTMLFilter(parser)
+        elements = (html_filter.elements + html_filter.stylesheet_link +
+                    html_filter.js_script + html_filter.frames)
+
+        sources = ([(element, attr, self.__absolute) for element, attr in elements] +
+                   [(element, attr, self.__absolute_srcset)
+                    for element, attr in html_filter.srcset_sources] +
+                   [(element, attr, self.__absolute_declarations)
+                    for element, attr in html_filter.description_style] +
+                   [(element, None, self.__absolute_stylesheet)
+                    for element, _ in html_filter.style])
+
+        return [(element, attr, _value_of(element, attr), absolutize)
+                for element, attr, absolutize in sources]
+
+    def __absolutize_unresolved_sources(self):
+        # the base element is removed, so the sources which were not
+        # migrated refer to their absolute URLs
+        for element, attr, source, absolutize in self._sources:
+            if not source or _value_of(element, attr) != source:
+                continue
+
+            try:
+                value = absolutize(source)
+            except Exception as e:
+                self._logger.error(f"Cannot absolutize {source!r}: {e}")
+            else:
+                _set_value_of(element, attr, value)
+
+    def __absolute(self, url):
+        return urllib.parse.urljoin(self.resolver.base, url)
+
+    def __absolute_srcset(self, value):
+        return srcset.format_srcset([candidate._replace(url=self.__absolute(candidate.url))
+                                     for candidate in srcset.parse_srcset(value)])
+
+    def __absolute_stylesheet(self, data, declaration=False):
+        if "url(" not in data.lower() and "@import" not in data.lower():
+            return data
+
+        parser = self._settings.css_parser(str(data), declaration=declaration)
+        parser.parse_tokens()
+
+        for token in parser.url_tokens + parser.import_tokens:
+            token.value = self.__absolute(token.value)
+
+        return parser.export()
+
+    def __absolute_declarations(self, data):
+        return self.__absolute_stylesheet(data, declaration=True)
+
+    def __init_resolver(self, parser, url):
         resolver = self._settings.resolver(url)
 
         try:
-            resolver.base = resolver.resolve(self.__parser.base["href"])
+            resolver.base = resolver.resolve(parser.base["href"])
         except Exception as e:
             self._logger.info(e)
 
         return resolver
 
     async def migrate_external_sources(self):
+        await self.__load()
         await self._html_migration.migrate()
 
-    def export(self):
-        with open(self._filepath, "wb") as fd:
-            fd.write(self.parser.export())
+    async def export(self):
+        async with self._settings.scheduler().slot(taskwrapper.Stage.WRITE):
+            if not self.loaded:
+                # the deadline expired before the parse, the body is the index
+                data = self.__body_with_base()
+            else:
+                data = await self.__export_parser()
+
+            with self._register.sink.open(self._filepath, "wb") as fd:
+                fd.write(data)
+
+            self._register.record(self._response.requested_url, self._filepath,
+                                  self._response.headers, self._response.status,
+                                  mime="text/html")
+
+
+    def __body_with_base(self):
+        # the sources of the body refer to the original location by the
+        # base element inserted to its head
+        self._response.content_descriptor.seek(0)
+        data = self._response.content_descriptor.read()
+        head = _HEAD_ELEMENT.search(data) or _HTML_ELEMENT.search(data)
+
+        if head is None or _BASE_ELEMENT.search(data) is not None:
+            return data
+
+        base = f'<base href="{html.escape(self._response.accessed_url)}">'
+        return data[:head.end()] + base.encode(DEFAULT_ENCODING) + data[head.end():]
+
+    async def __export_parser(self):
+        self.__absolutize_unresolved_sources()
+
+        if self._settings.parser_pool is None:
+            return self.parser.export()
+        else:
+            return await self._settings.parser_pool().export(self.parser)
+
+
+def _value_of(element, attr):
+    # the attribute of the element or its string when the attr is None
+    return element.string if attr is None else element[attr]
+
+
+def _set_value_of(element, attr, value):
+    if attr is None:
+        element.string = value
+    else:
+        element[attr] = value
+
+
+def _init_snapshot_client(http_client, src_register):
+    # the resources of the previous snapshot of the page are requested
+    # conditionally by their recorded validators
+    if src_register.previous is None:
+        return http_client
+    else:
+        return snapshot.SnapshotClient(http_client, src_register.previous)
+
+
+def _init_asset_cache(settings, src_register):
+    # the shared register is the asset cache of the jobs without one, the
+    # bodies are not stored by both of them
+    if settings.asset_cache is None:
+        return src_register.shared
+    else:
+        return settings.asset_cache()
+
+
+def _init_http_client(settings, asset_cache):
+    # the recorder gets only the responses received from the network
+    http_client = settings.http_client()
+
+    if settings.recorder is not None:
+        http_client = httplib.RecordingClient(http_client, settings.recorder)
+
+    if asset_cache is None:
+        return http_client
+    else:
+        return cache.CachingClient(http_client, asset_cache)
+
+
+def _apply_policy(handler, kind, entity_property, settings):
+    if settings.resource_policy is None:
+        return handler
+    else:
+        return policy.PolicyHandler(handler, kind, entity_property, settings)
+
+
+def _allows_of(handler):
+    if isinstance(handler, policy.PolicyHandler):
+        return handler.allows
+    else:
+        return None
+
+
+def _init_register(src_register):
+    # an entity migrated without the register of the archive job
+    # gets its own one, it is not shared with the other migrations
+    if src_register is None:
+        return register.ResourceRegister()
+    else:
+        return src_register
 
 
 class IndexFileContainer:
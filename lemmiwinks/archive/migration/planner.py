@@ -0,0 +1,82 @@
+import asyncio
+import contextlib
+import contextvars
+import logging
+
+from . import container
+
+# the depth of the resource migrated by the current task, the tasks of the
+# planned resources and their subtasks inherit it
+_depth = contextvars.ContextVar("depth", default=0)
+
+
+def current_depth():
+    return _depth.get()
+
+
+@contextlib.contextmanager
+def deeper():
+    # the resource migrated in the task of its parent is one level deeper
+    # than the parent while it is migrated
+    token = _depth.set(_depth.get() + 1)
+
+    try:
+        yield
+    finally:
+        _depth.reset(token)
+
+
+class ResourcePlanner:
+    """
+    Planner of the recursive resources of one archive job. The stylesheets
+    and documents found by the migration are not migrated in the task of
+    their parent, they are started right away as the tasks of their own
+    one level deeper in the resource graph. Every resource is fetched with
+    the priority of its depth and kind, so the shallow resources of the
+    whole page go first while the deeper ones do not wait for the whole
+    level above them.
+    """
+
+    def __init__(self):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.__tasks = list()
+
+    @property
+    def depth(self):
+        return current_depth()
+
+    def priority_of(self, kind: container.ResourceKind) -> int:
+        return self.depth * len(container.ResourceKind) + kind
+
+    def schedule(self, kind: container.ResourceKind, job):
+        # the job is a coroutine function, it is started one level deeper
+        # than the resource which found it
+        depth = self.depth + 1
+        task = asyncio.get_event_loop().create_task(self.__run_job(depth, job))
+        self.__tasks.append(task)
+
+        self.__logger.debug(f"resource of kind {kind} planned at level {depth}")
+
+    async def run(self):
+        # the running jobs may plan other ones, so the tasks are awaited
+        # until no job is left
+        while self.__pending():
+            await asyncio.gather(*self.__pending())
+
+    async def cancel(self):
+        # the cancelled jobs write what they migrated so far before they end
+        pending = self.__pending()
+
+        for task in pending:
+            task.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    def __pending(self):
+        self.__tasks = [task for task in self.__tasks if not task.done()]
+        return list(self.__tasks)
+
+    @staticmethod
+    async def __run_job(depth, job):
+        _depth.set(depth)
+        await job()
@@ -0,0 +1,144 @@
+import enum
+import fnmatch
+import logging
+import re
+import urllib.parse
+
+from . import abstract
+from . import container
+
+TRACKER_DOMAINS = (
+    "doubleclick.net", "googlesyndication.com", "googleadservices.com",
+    "google-analytics.com", "googletagmanager.com", "googletagservices.com",
+    "adservice.google.com", "facebook.net", "connect.facebook.net",
+    "scorecardresearch.com", "hotjar.com", "criteo.com", "criteo.net",
+    "taboola.com", "outbrain.com", "amazon-adsystem.com", "adnxs.com",
+    "quantserve.com", "chartbeat.com", "mixpanel.com", "segment.com",
+)
+
+
+class PolicyAction(enum.Enum):
+    ALLOW = enum.auto()
+    DENY = enum.auto()
+
+
+class PolicyRule:
+    """
+    Rule of the resource policy. The rule matches a resource when all of
+    its given conditions match. The domains are the glob patterns of host
+    names, a pattern without a wildcard matches the domain and all of its
+    subdomains. The third_party condition compares the site of the resource
+    with the site of the archived page, the site is the last two labels of
+    the host name.
+    """
+
+    def __init__(self, action: PolicyAction, domains=None, kinds=None,
+                 pattern=None, third_party=None):
+        self.action = action
+        self.domains = None if domains is None else tuple(domains)
+        self.kinds = None if kinds is None else frozenset(kinds)
+        self.pattern = None if pattern is None else re.compile(pattern)
+        self.third_party = third_party
+
+    def matches(self, url, kind, origin=None):
+        host = _host_of(url)
+
+        if self.kinds is not None and kind not in self.kinds:
+            return False
+        elif self.domains is not None and not any(_match_domain(host, domain)
+                                                  for domain in self.domains):
+            return False
+        elif self.pattern is not None and self.pattern.search(url) is None:
+            return False
+        elif self.third_party is not None and origin is not None:
+            return self.third_party == (_site_of(host) != _site_of(_host_of(origin)))
+        else:
+            return True
+
+
+class ResourcePolicy:
+    """
+    Decides which of the referenced resources are migrated. The first
+    matching rule decides, the default action is used when no rule matches.
+    The max_depth maps the resource kind to the deepest level of the
+    resource graph where it is migrated, the archived page is the level 0
+    and its resources are the level 1. The references of the denied
+    resources are rewritten to the placeholder.
+    """
+
+    def __init__(self, rules=(), max_depth=None,
+                 default=PolicyAction.ALLOW, placeholder="about:blank"):
+        self.rules = list(rules)
+        self.max_depth = dict(max_depth or dict())
+        self.default = default
+        self.placeholder = placeholder
+
+    def allows(self, url, kind, origin=None, depth=1):
+        if depth > self.max_depth.get(kind, depth):
+            return False
+
+        for rule in self.rules:
+            if rule.matches(url, kind, origin):
+                return rule.action is PolicyAction.ALLOW
+
+        return self.default is PolicyAction.ALLOW
+
+
+def no_trackers(domains=TRACKER_DOMAINS):
+    return PolicyRule(PolicyAction.DENY, domains=domains)
+
+
+def no_third_party_media():
+    return PolicyRule(PolicyAction.DENY, kinds=[container.ResourceKind.MEDIA],
+                      third_party=True)
+
+
+def no_scripts():
+    return PolicyRule(PolicyAction.DENY, kinds=[container.ResourceKind.SCRIPT])
+
+
+def no_frames():
+    return PolicyRule(PolicyAction.DENY, kinds=[container.ResourceKind.DOCUMENT])
+
+
+class PolicyHandler(abstract.DataHandler):
+    """
+    Applies the resource policy before the wrapped handler is called,
+    the denied URL is replaced by the placeholder of the policy.
+    """
+
+    def __init__(self, handler, kind, entity_property, settings):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.__handler = handler
+        self.__kind = kind
+        self.__policy = settings.resource_policy()
+        self.__register = entity_property.register
+        self.__base = entity_property.resolver.base
+
+    async def process(self, url):
+        if self.allows(url):
+            return await self.__handler.process(url)
+        else:
+            self.__logger.info(f"{self.__kind.name} {url} is denied by the policy")
+            return self.__policy.placeholder
+
+    def allows(self, url):
+        origin = self.__register.origin or self.__base
+        depth = self.__register.depth + 1
+
+        return self.__policy.allows(url, self.__kind, origin, depth)
+
+
+def _host_of(url):
+    return (urllib.parse.urlparse(url).hostname or "").lower()
+
+
+def _site_of(host):
+    return ".".join(host.split(".")[-2:])
+
+
+def _match_domain(host, domain):
+    if any(character in domain for character in "*?["):
+        return fnmatch.fnmatch(host, domain)
+    else:
+        return host == domain or host.endswith(f".{domain}")
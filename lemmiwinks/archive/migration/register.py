@@ -0,0 +1,245 @@
+import asyncio
+import os
+import shutil
+
+import lemmiwinks.taskwrapper as taskwrapper
+
+from . import cache
+from . import planner
+from . import snapshot
+
+
+class ResourceRegister(dict):
+    """
+    Register of the resources migrated by one archive job, it maps the URLs
+    to the paths of the migrated files. The optional shared register caches
+    the downloads of the jobs which have no asset cache.
+    The recursive resources are migrated by the optional planner of the job,
+    they are migrated depth-first in the task of their parent without it,
+    so the depth of the resource is known either way.
+    The work of the job is bounded by the deadline. The origin is the URL
+    of the archived page. The stored files are recorded to the manifest of
+    the job and described to the sink by one record, the previous snapshot
+    of the page is used by the incremental archiving. The files of the job are written through the sink, such as
+    the tab of the archive. The optional envelope register holds the files
+    stored by the other jobs of the same archive.
+    """
+
+    def __init__(self, shared=None, planner=None, deadline=None, origin=None, previous=None,
+                 sink=None, envelope=None):
+        super().__init__()
+        self.__sink = sink if sink is not None else DirectorySink()
+        self.__envelope = envelope
+        self.__shared = shared
+        self.__planner = planner
+        self.__origin = origin
+        self.__previous = previous
+        self.__manifest = snapshot.Manifest(origin)
+        self.__deadline = deadline if deadline is not None else taskwrapper.Deadline()
+        self.__pending = dict()
+
+    @property
+    def sink(self):
+        return self.__sink
+
+    @property
+    def shared(self):
+        return self.__shared
+
+    @property
+    def envelope(self):
+        return self.__envelope
+
+    @property
+    def planner(self):
+        return self.__planner
+
+    @property
+    def deadline(self):
+        return self.__deadline
+
+    @property
+    def origin(self):
+        return self.__origin
+
+    @property
+    def previous(self):
+        return self.__previous
+
+    @property
+    def manifest(self):
+        return self.__manifest
+
+    @property
+    def depth(self):
+        # the depth of the resource migrated by the current task
+        return planner.current_depth()
+
+    @staticmethod
+    def deeper():
+        return planner.deeper()
+
+    def record(self, url, path, headers=None, status=None, digest=None, mime=None):
+        # the manifest entry and the description of the file for the
+        # integrity manifest of the sink are made from the same record
+        self.__manifest.record(url, path, headers, digest)
+
+        if not path.startswith("data:"):
+            self.__sink.describe(path, url, status, mime or _mime_of(headers))
+
+    def missing(self):
+        # the registered resources which were not fetched or written
+        return sorted({url for url, path in self.items()
+                       if url and (not path or not (path.startswith("data:")
+                                                    or self.__sink.exists(path)))})
+
+    def priority_of(self, kind):
+        if self.__planner is None:
+            return kind
+        else:
+            return self.__planner.priority_of(kind)
+
+    def reserve(self, url, path):
+        # the path of a reserved URL can still change, the other migrations
+        # of the URL wait for the resolve of the reservation
+        self.update({url: path})
+        self.__pending[url] = asyncio.get_event_loop().create_future()
+
+    def resolve(self, url, path):
+        self.update({url: path})
+        future = self.__pending.pop(url, None)
+
+        if future is not None and not future.done():
+            future.set_result(path)
+
+    async def get_resolved(self, url):
+        future = self.__pending.get(url)
+
+        if future is not None:
+            await asyncio.shield(future)
+
+        return self.get(url)
+
+
+class EnvelopeRegister(dict):
+    """
+    Register of the files stored by the jobs of one archive, it maps the
+    URLs to the paths of the stored files. The job reuses the file stored
+    by the other job by its relative path instead of storing it again, the
+    files of other URLs are found by their digest.
+
+    The URL is reserved by the first job which stores it. The other jobs
+    wait for the stored file by the get_stored method, which gives its
+    path, digest and response headers. The URL released without the file
+    is reserved by the next job. The reserved path of the URL is known
+    before the file is stored, so the recursive resources are referred by
+    it without waiting.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.__paths = dict()
+        self.__pending = dict()
+
+    def reserve(self, url, path=None):
+        # returns False when the URL is stored or reserved by other job
+        if url in self or url in self.__pending:
+            return False
+
+        self.__pending[url] = (path, asyncio.get_event_loop().create_future())
+        return True
+
+    def reserved_path_of(self, url):
+        if url in self:
+            path = self[url][0]
+        else:
+            path, _ = self.__pending.get(url, (None, None))
+
+        return path
+
+    def add(self, url, path, digest=None, headers=None):
+        self.update({url: (path, digest, headers)})
+
+        if digest is not None:
+            self.__paths.setdefault(digest, path)
+
+        self.release(url)
+
+    def release(self, url):
+        _, future = self.__pending.pop(url, (None, None))
+
+        if future is not None and not future.done():
+            future.set_result(None)
+
+    async def get_stored(self, url):
+        _, future = self.__pending.get(url, (None, None))
+
+        if future is not None:
+            await asyncio.shield(future)
+
+        return self.get(url)
+
+    def path_of(self, digest):
+        return self.__paths.get(digest)
+
+
+class DirectorySink:
+    """
+    Sink which writes the files of the job to the filesystem.
+    """
+
+    @staticmethod
+    def exists(path):
+        return os.path.exists(path)
+
+    @staticmethod
+    def store(path, source):
+        link_or_copy(source, path)
+
+    @staticmethod
+    def open(path, mode="wb"):
+        return open(path, mode)
+
+    @staticmethod
+    def describe(path, url=None, status=None, mime=None):
+        pass
+
+
+class SharedResourceRegister(cache.AssetCache):
+    """
+    Cross job LRU register of the downloaded resources. It is the asset
+    cache of the jobs without the asset cache setting, bounded by the number
+    of the entries, so the bodies are stored once by their digest and the
+    entries older than max_age are revalidated before they are used again.
+    """
+
+    def __init__(self, location, max_entries=4096, max_age=24 * 60 * 60, max_size=1024 ** 3):
+        super().__init__(location, max_size, max_age, max_entries)
+
+
+def _mime_of(headers):
+    content_type = (headers or dict()).get("content-type")
+    return None if content_type is None else content_type.split(";")[0].strip()
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        # the copy is written to the partial file first, so the failed
+        # copy does not leave the truncated file at the destination
+        partial = f"{os.fspath(dst)}.part"
+
+        try:
+            shutil.copyfile(src, partial)
+            os.replace(partial, dst)
+        except BaseException:
+            _unlink(partial)
+            raise
+
+
+def _unlink(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,208 @@
+import collections
+import html
+import io
+import json
+import logging
+import os
+import pathlib
+import posixpath
+import re
+import shutil
+import tempfile
+import urllib.parse
+import zipfile
+
+import lemmiwinks.httplib as httplib
+
+ManifestEntry = collections.namedtuple("ManifestEntry", "path etag last_modified sha256")
+
+
+class Manifest(dict):
+    """
+    Manifest of the downloaded resources of one tab, it maps the URLs to
+    the manifest entries. The manifest is saved next to the index file, so
+    the next snapshot of the page can reuse the unchanged resources. The
+    entries are recorded by the ResourceRegister.record method, which
+    describes the same files for the integrity manifest of the tab.
+    """
+
+    NAME = "manifest.json"
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.url = url
+
+    def record(self, url, path, headers=None, sha256=None):
+        headers = headers or dict()
+        self.update({url: ManifestEntry(path, headers.get("etag"),
+                                        headers.get("last-modified"), sha256)})
+
+    def save_to(self, location, exists=os.path.exists):
+        resources = dict()
+
+        location = pathlib.Path(location).resolve()
+
+        for url, entry in self.items():
+            if not os.path.isabs(entry.path) or not exists(entry.path):
+                continue
+
+            # the path is relative to the tab, the files of other tabs included
+            path = pathlib.PurePath(os.path.relpath(entry.path, str(location)))
+            resources[url] = entry._replace(path=path.as_posix())._asdict()
+
+        with open(str(pathlib.Path(location).joinpath(self.NAME)), "w") as fd:
+            json.dump({"url": self.url, "resources": resources}, fd)
+
+    @classmethod
+    def load_from(cls, fd):
+        data = json.load(fd)
+        manifest = cls(data.get("url"))
+
+        for url, entry in data.get("resources", dict()).items():
+            manifest.update({url: ManifestEntry(**entry)})
+
+        return manifest
+
+
+class Snapshot:
+    """
+    Previous MAFF archive used by the incremental archiving. The tabs are
+    found by the original URL of their manifest.
+    """
+
+    def __init__(self, maff_path):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.__zip_file = zipfile.ZipFile(maff_path)
+        self.__tabs = dict()
+        self.__load_manifests()
+
+    def __load_manifests(self):
+        for name in self.__zip_file.namelist():
+            path = pathlib.PurePosixPath(name)
+
+            if path.name != Manifest.NAME or len(path.parts) != 2:
+                continue
+
+            try:
+                with self.__zip_file.open(name) as fd:
+                    manifest = Manifest.load_from(io.TextIOWrapper(fd, encoding="utf-8"))
+            except (KeyError, ValueError) as e:
+                self.__logger.error(f"Cannot read {name}: {e}")
+            else:
+                self.__tabs[manifest.url] = TabSnapshot(self.__zip_file, path.parent, manifest)
+
+    def tab_for(self, url):
+        return self.__tabs.get(url)
+
+    def close(self):
+        self.__zip_file.close()
+
+
+class TabSnapshot:
+    """
+    Tab of the previous archive. The documents of the tab, such as the
+    stylesheets and frames, refer to the other files by their relative
+    paths, so the paths of the recorded files are replaced by their URLs
+    before the document is migrated again.
+    """
+
+    DOCUMENT_TYPES = {".css": "text/css", ".html": "text/html", ".htm": "text/html"}
+
+    def __init__(self, zip_file, tab, manifest):
+        self.__zip_file = zip_file
+        self.__tab = tab
+        self.__manifest = manifest
+
+    def lookup(self, url):
+        return self.__manifest.get(url)
+
+    @staticmethod
+    def validators_of(entry):
+        headers = dict()
+
+        if entry.etag is not None:
+            headers["If-None-Match"] = entry.etag
+        if entry.last_modified is not None:
+            headers["If-Modified-Since"] = entry.last_modified
+
+        return headers
+
+    def response_for(self, url, entry, descriptor_budget=None):
+        content_descriptor = tempfile.NamedTemporaryFile()
+        mime = self.DOCUMENT_TYPES.get(posixpath.splitext(entry.path)[1].lower())
+
+        try:
+            arcname = posixpath.normpath(posixpath.join(str(self.__tab), entry.path))
+
+            with self.__zip_file.open(arcname) as fd:
+                if mime is None:
+                    shutil.copyfileobj(fd, content_descriptor)
+                else:
+                    content_descriptor.write(self.__sources_of(entry.path, mime, fd.read()))
+        except BaseException:
+            content_descriptor.close()
+            raise
+
+        headers = {"etag": entry.etag, "last-modified": entry.last_modified, "content-type": mime}
+        # the digest of the document differs from the one of the stored file
+        digest = entry.sha256 if mime is None else None
+        return httplib.Response(content_descriptor, [(url, 200)],
+                                {key: value for key, value in headers.items() if value is not None},
+                                descriptor_budget, digest)
+
+    def __sources_of(self, path, mime, data):
+        directory = posixpath.dirname(path) or "."
+        sources = dict()
+
+        for url, entry in self.__manifest.items():
+            sources.setdefault(posixpath.relpath(entry.path, directory).encode("utf-8"), url)
+
+        if not sources:
+            return data
+
+        escape = html.escape if mime == "text/html" else _quote
+        # the path is replaced only as the whole value of the reference
+        pattern = re.compile(rb"(?<=[\"'(\s,=])("
+                             + b"|".join(map(re.escape, sorted(sources, key=len, reverse=True)))
+                             + rb")(?=[\"')\s,])")
+
+        return pattern.sub(lambda match: escape(sources[match.group(1)]).encode("utf-8"), data)
+
+
+def _quote(url):
+    # the URL written to the stylesheet has no quotes nor parentheses
+    return urllib.parse.quote(url, safe="%/:=&?~#+!$,;@*[]")
+
+
+class SnapshotClient:
+    """
+    Wraps the http client, the resources known from the previous snapshot
+    are requested conditionally and reused when they were not modified.
+    """
+
+    def __init__(self, http_client, tab_snapshot):
+        self.__http_client = http_client
+        self.__tab_snapshot = tab_snapshot
+        self.__descriptor_budget = httplib.DescriptorBudget()
+
+    async def get_request(self, url, headers=None):
+        entry = self.__tab_snapshot.lookup(url)
+
+        if entry is None:
+            return await self.__http_client.get_request(url, headers)
+
+        validators = self.__tab_snapshot.validators_of(entry)
+        response = await self.__http_client.get_request(
+            url, headers={**(headers or dict()), **validators} or None)
+
+        if response.status != 304:
+            return response
+
+        response.close()
+        await self.__descriptor_budget.acquire()
+
+        try:
+            return self.__tab_snapshot.response_for(url, entry, self.__descriptor_budget)
+        except BaseException:
+            self.__descriptor_budget.release()
+            raise
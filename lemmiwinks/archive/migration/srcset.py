@@ -0,0 +1,130 @@
+import abc
+import collections
+
+SrcsetCandidate = collections.namedtuple("SrcsetCandidate", "url width density")
+
+
+def parse_srcset(value: str) -> list:
+    """
+    Splits the srcset attribute to the image candidates. The URL of a
+    candidate may contain commas, so the value is processed as described
+    in the HTML specification and not by a plain split.
+    """
+    candidates = list()
+    position, length = 0, len(value)
+
+    while True:
+        while position < length and (value[position].isspace() or value[position] == ","):
+            position += 1
+
+        if position >= length:
+            return candidates
+
+        start = position
+        while position < length and not value[position].isspace():
+            position += 1
+        url = value[start:position]
+
+        if url.endswith(","):
+            url, descriptors = url.rstrip(","), ""
+        else:
+            start, depth = position, 0
+            while position < length and (value[position] != "," or depth > 0):
+                if value[position] == "(":
+                    depth += 1
+                elif value[position] == ")":
+                    depth = max(depth - 1, 0)
+                position += 1
+            descriptors = value[start:position]
+
+        candidates.append(_create_candidate(url, descriptors.split()))
+
+
+def format_srcset(candidates: list) -> str:
+    """
+    Joins the image candidates to the srcset attribute.
+    """
+    return ", ".join(" ".join([candidate.url] + _descriptors_of(candidate))
+                     for candidate in candidates)
+
+
+def _descriptors_of(candidate):
+    if candidate.width is not None:
+        return [f"{candidate.width}w"]
+    elif candidate.density is not None:
+        return [f"{candidate.density:g}x"]
+    else:
+        return list()
+
+
+def _create_candidate(url, descriptors):
+    width, density = None, None
+
+    for descriptor in descriptors:
+        try:
+            if descriptor.endswith("w"):
+                width = int(descriptor[:-1])
+            elif descriptor.endswith("x"):
+                density = float(descriptor[:-1])
+        except ValueError:
+            continue
+
+    # a candidate without descriptors is 1x
+    if width is None and density is None:
+        density = 1.0
+
+    return SrcsetCandidate(url, width, density)
+
+
+class SrcsetPolicy(metaclass=abc.ABCMeta):
+    # the select method returns None when there is no candidate
+    @abc.abstractmethod
+    def select(self, candidates: list) -> SrcsetCandidate:
+        raise NotImplemented()
+
+
+class DensityPolicy(SrcsetPolicy):
+    """
+    Selects the candidate with the pixel density closest to the density,
+    for example DensityPolicy(1) keeps only the 1x images.
+    """
+
+    def __init__(self, density=1.0):
+        self.__density = density
+
+    def select(self, candidates):
+        densities = [candidate for candidate in candidates if candidate.density is not None]
+
+        if not candidates:
+            return None
+        elif densities:
+            return min(densities, key=lambda candidate: abs(candidate.density - self.__density))
+        else:
+            return min(candidates, key=lambda candidate: candidate.width)
+
+
+class MaxWidthPolicy(SrcsetPolicy):
+    """
+    Selects the widest candidate up to the max_width pixels or the smallest
+    one when all of them are wider. The candidates with the density
+    descriptors are selected by the DensityPolicy.
+    """
+
+    def __init__(self, max_width=1920, density=1.0):
+        self.__max_width = max_width
+        self.__density_policy = DensityPolicy(density)
+
+    def select(self, candidates):
+        widths = [candidate for candidate in candidates if candidate.width is not None]
+
+        if not candidates:
+            return None
+        elif not widths:
+            return self.__density_policy.select(candidates)
+
+        fitting = [candidate for candidate in widths if candidate.width <= self.__max_width]
+
+        if fitting:
+            return max(fitting, key=lambda candidate: candidate.width)
+        else:
+            return min(widths, key=lambda candidate: candidate.width)
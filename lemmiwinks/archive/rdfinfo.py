@@ -9,9 +9,17 @@ class ResponseMaffRDFInfo:
     def __init__(self, response):
         self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
         self.__response = response
+        self.__index_name = None
 
     @property
     def index_name(self):
+        # the name is kept, so it is known after the response is closed
+        if self.__index_name is None:
+            self.__index_name = self.__get_index_name()
+
+        return self.__index_name
+
+    def __get_index_name(self):
         try:
             response_path = self.__response.content_descriptor.name
             url = self.__response.accessed_url
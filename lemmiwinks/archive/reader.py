@@ -0,0 +1,277 @@
+import collections
+import io
+import logging
+import mmap
+import os
+import posixpath
+import struct
+import threading
+import zipfile
+import zlib
+
+from . import maff
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_LOCAL_HEADER = struct.Struct("<4s5H3L2H")
+# the maximal size of the zstd frame header
+_ZSTD_FRAME_HEADER_SIZE = 18
+
+
+class TabIndex:
+    """
+    Index of one tab of the archive. The entries map the paths relative to
+    the tab directory to the zip infos, the rdf is the parsed index.rdf.
+    """
+
+    def __init__(self, name, rdf=None):
+        self.name = name
+        self.rdf = rdf
+        self.entries = dict()
+
+    @property
+    def url(self):
+        return None if self.rdf is None else self.rdf.url
+
+    @property
+    def title(self):
+        return None if self.rdf is None else self.rdf.title
+
+    @property
+    def index_name(self):
+        index_name = None if self.rdf is None else self.rdf.index_file_name
+        return index_name or "index.html"
+
+
+class ArchiveIndex:
+    """
+    Parsed central directory of the archive, the tabs are kept in the order
+    of their first entry in the archive. The files are the entries in the
+    root of the archive, such as the zstd dictionary.
+    """
+
+    RDF_NAME = "index.rdf"
+
+    def __init__(self, zip_file):
+        self.tabs = collections.OrderedDict()
+        self.files = dict()
+
+        for zip_info in zip_file.infolist():
+            name, _, path = zip_info.filename.partition("/")
+
+            if path and not zip_info.is_dir():
+                self.tabs.setdefault(name, TabIndex(name)).entries[path] = zip_info
+            elif not path:
+                self.files[name] = zip_info
+
+        for tab in self.tabs.values():
+            if self.RDF_NAME in tab.entries:
+                with zip_file.open(tab.entries[self.RDF_NAME]) as fd:
+                    tab.rdf = maff.RDF.load(fd, self.RDF_NAME)
+
+
+class _IndexCache:
+    # the parsed indexes of the recently opened archives, an archive is
+    # parsed again when its size or modification time changed
+    def __init__(self, max_entries=64):
+        self._indexes = collections.OrderedDict()
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def index_of(self, filepath):
+        stat = os.stat(filepath)
+        key = (os.path.realpath(filepath), stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            if key in self._indexes:
+                self._indexes.move_to_end(key)
+                return self._indexes[key]
+
+        with zipfile.ZipFile(filepath) as zip_file:
+            index = ArchiveIndex(zip_file)
+
+        with self._lock:
+            self._indexes[key] = index
+
+            while len(self._indexes) > self._max_entries:
+                self._indexes.popitem(last=False)
+
+        return index
+
+
+_index_cache = _IndexCache()
+
+
+class MaffReader:
+    """
+    Random access reader of the MAFF archive. The central directory and
+    the RDF files of the tabs are parsed once and cached for the process,
+    the entries are read on demand from the memory mapped archive. The
+    stored entries are served without a copy by the view method, the
+    deflated and zstd ones are decompressed while they are read.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, filepath):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._filepath = filepath
+        self._index = _index_cache.index_of(filepath)
+        self._fd = open(filepath, "rb")
+        self._map = mmap.mmap(self._fd.fileno(), 0, access=mmap.ACCESS_READ)
+        self._offsets = dict()
+        self._dictionaries = dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._fd.close()
+
+    @property
+    def tabs(self):
+        return list(self._index.tabs.values())
+
+    def tab(self, name):
+        return self._index.tabs[name]
+
+    def tab_for(self, url):
+        for tab in self._index.tabs.values():
+            if tab.url == url:
+                return tab
+
+        return None
+
+    def view(self, tab, path) -> memoryview:
+        """
+        Returns the content of the stored entry without a copy, the view
+        has to be released before the reader is closed.
+        """
+        zip_info = self.__entry_of(tab, path)
+
+        if zip_info.compress_type != zipfile.ZIP_STORED:
+            raise ValueError(f"{zip_info.filename} is not stored.")
+
+        start = self.__data_offset_of(zip_info)
+        return memoryview(self._map)[start:start + zip_info.file_size]
+
+    def iter_content(self, tab, path):
+        """
+        Yields the content of the entry in chunks.
+        """
+        return self.__iter_entry(self.__entry_of(tab, path))
+
+    def __iter_entry(self, zip_info):
+        start = self.__data_offset_of(zip_info)
+        end = start + zip_info.compress_size
+
+        if zip_info.compress_type == zipfile.ZIP_STORED:
+            yield from self.__iter_chunks(start, end)
+        elif zip_info.compress_type == zipfile.ZIP_DEFLATED:
+            decompressor = zlib.decompressobj(-15)
+
+            for chunk in self.__iter_chunks(start, end):
+                yield decompressor.decompress(chunk)
+
+            yield decompressor.flush()
+        elif zip_info.compress_type == maff.ZIP_ZSTANDARD and zstandard is not None:
+            decompressor = self.__zstd_decompressor_of(start, end).decompressobj()
+
+            for chunk in self.__iter_chunks(start, end):
+                yield decompressor.decompress(chunk)
+        else:
+            yield from self.__iter_by_zipfile(zip_info)
+
+    def __iter_chunks(self, start, end):
+        for offset in range(start, end, self.CHUNK_SIZE):
+            yield self._map[offset:min(offset + self.CHUNK_SIZE, end)]
+
+    def __zstd_decompressor_of(self, start, end):
+        # the frame refers to the dictionary stored in the root of the archive
+        header = self._map[start:min(start + _ZSTD_FRAME_HEADER_SIZE, end)]
+        dict_id = zstandard.get_frame_parameters(header).dict_id
+
+        if not dict_id:
+            return zstandard.ZstdDecompressor()
+
+        if dict_id not in self._dictionaries:
+            name = maff.CompressionPolicy.DICTIONARY_NAME.format(dict_id)
+            data = b"".join(self.__iter_entry(self._index.files[name]))
+            self._dictionaries[dict_id] = zstandard.ZstdCompressionDict(data)
+
+        return zstandard.ZstdDecompressor(dict_data=self._dictionaries[dict_id])
+
+    def read(self, tab, path) -> bytes:
+        return b"".join(self.iter_content(tab, path))
+
+    def open(self, tab, path):
+        return io.BufferedReader(_ChunkReader(self.iter_content(tab, path)), self.CHUNK_SIZE)
+
+    def read_index(self, tab) -> bytes:
+        tab = self.__tab_of(tab)
+        return self.read(tab, tab.index_name)
+
+    def __tab_of(self, tab):
+        return tab if isinstance(tab, TabIndex) else self._index.tabs[tab]
+
+    def __entry_of(self, tab, path):
+        # the relative path may lead to the file shared by other tab
+        tab = self.__tab_of(tab)
+        arcname = posixpath.normpath(posixpath.join(tab.name, path.lstrip("/")))
+        name, _, path = arcname.partition("/")
+
+        try:
+            return self._index.tabs[name].entries[path]
+        except KeyError:
+            raise KeyError(f"There is no {arcname} in the archive.") from None
+
+    def __data_offset_of(self, zip_info):
+        # the local header may have other extra fields than the central one
+        try:
+            return self._offsets[zip_info.filename]
+        except KeyError:
+            pass
+
+        header = _LOCAL_HEADER.unpack_from(self._map, zip_info.header_offset)
+
+        if header[0] != zipfile.stringFileHeader:
+            raise zipfile.BadZipFile(f"Bad local header of {zip_info.filename}.")
+
+        name_length, extra_length = header[-2:]
+        offset = zip_info.header_offset + _LOCAL_HEADER.size + name_length + extra_length
+
+        self._offsets[zip_info.filename] = offset
+        return offset
+
+    def __iter_by_zipfile(self, zip_info):
+        with zipfile.ZipFile(self._filepath) as zip_file, zip_file.open(zip_info) as fd:
+            yield from iter(lambda: fd.read(self.CHUNK_SIZE), b"")
+
+
+class _ChunkReader(io.RawIOBase):
+    def __init__(self, chunks):
+        self.__chunks = chunks
+        self.__buffer = b""
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.__buffer:
+            try:
+                self.__buffer = next(self.__chunks)
+            except StopIteration:
+                return 0
+
+        size = min(len(buffer), len(self.__buffer))
+        buffer[:size] = self.__buffer[:size]
+        self.__buffer = self.__buffer[size:]
+
+        return size
@@ -0,0 +1,225 @@
+import base64
+import contextlib
+import datetime
+import gzip
+import hashlib
+import http
+import logging
+import os
+import threading
+import urllib.parse
+import uuid
+
+WARC_VERSION = "WARC/1.1"
+
+# the body of the response is decoded by the client, so its original
+# framing does not describe the recorded payload
+_FRAMING_HEADERS = frozenset({"content-encoding", "transfer-encoding", "content-length"})
+
+
+class WARCWriter:
+    """
+    Append only writer of the WARC/1.1 files. Every record is a gzip member
+    of its own, so the files can be read from any record offset. A new file
+    is started once the current one grows over max_size bytes, every file
+    starts with the warcinfo record. The response records are written with
+    the request records of their exchanges, the file is rolled over only
+    between them, so the WARC-Concurrent-To of a request is always in its
+    file. The records which fail are truncated from the file.
+
+    The writer is the recorder of the httplib.RecordingClient, which calls
+    it in the executor. The writer is thread safe, it writes the request
+    and response records of the responses received by the client.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, prefix, max_size=1024 ** 3, info=None):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self._prefix = prefix
+        self._max_size = max_size
+        self._info = dict(info or dict())
+        self._serial = 0
+        self._fd = None
+        self._filepaths = list()
+        self._lock = threading.RLock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def filepaths(self):
+        return list(self._filepaths)
+
+    def record(self, url, request_headers, response):
+        """
+        Writes the records of the response and of its redirects, the body
+        of the response is left at its start.
+        """
+        if response.closed:
+            return
+
+        hops = response.url_and_status or [(url, None)]
+
+        with self._lock, self.__records():
+            for (hop_url, status), (next_url, _) in zip(hops, hops[1:]):
+                self.__write_exchange(hop_url, request_headers, status,
+                                      {"location": next_url}, b"")
+
+            hop_url, status = hops[-1]
+            self.__write_exchange(hop_url, request_headers, status or 200,
+                                  response.headers, response.content_descriptor)
+
+    def write_metadata(self, url, block: bytes, content_type="application/warc-fields"):
+        with self._lock, self.__records():
+            return self.__append("metadata", content_type, [block],
+                                 [("WARC-Target-URI", url)])
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                self._fd.close()
+                self._fd = None
+
+    @contextlib.contextmanager
+    def __records(self):
+        # the records written in the block go to the same file, the ones
+        # written before the failure are truncated
+        if self._fd is None or self._fd.tell() >= self._max_size:
+            self.__open_next_file()
+
+        start = self._fd.tell()
+
+        try:
+            yield
+        except BaseException:
+            self._fd.seek(start)
+            self._fd.truncate()
+            raise
+
+    def __write_exchange(self, url, request_headers, status, headers, body):
+        response_id = self.__append(
+            "response", "application/http; msgtype=response",
+            [_response_head(status, headers, _size_of(body)), body],
+            [("WARC-Target-URI", url)], payload=body)
+
+        self.__append(
+            "request", "application/http; msgtype=request",
+            [_request_head(url, request_headers)],
+            [("WARC-Target-URI", url), ("WARC-Concurrent-To", response_id)])
+
+    def __open_next_file(self):
+        self.close()
+
+        self._serial += 1
+        timestamp = datetime.datetime.now(datetime.timezone.utc).strftime("%Y%m%d%H%M%S")
+        filepath = f"{self._prefix}-{timestamp}-{self._serial:05d}.warc.gz"
+
+        self._fd = open(filepath, "xb")
+        self._filepaths.append(filepath)
+        self.__logger.debug(f"writing {filepath}")
+
+        fields = {"software": "lemmiwinks", "format": "WARC File Format 1.1", **self._info}
+        block = "".join(f"{name}: {value}\r\n" for name, value in fields.items())
+        self.__append("warcinfo", "application/warc-fields", [block.encode("utf-8")],
+                      [("WARC-Filename", os.path.basename(filepath))])
+
+    def __append(self, warc_type, content_type, block, headers, payload=None):
+        record_id = f"<urn:uuid:{uuid.uuid4()}>"
+        length, block_digest, payload_digest = self.__digests_of(block, payload)
+
+        fields = [("WARC-Type", warc_type),
+                  ("WARC-Record-ID", record_id),
+                  ("WARC-Date", _warc_date()),
+                  *headers,
+                  ("Content-Type", content_type),
+                  ("Content-Length", length),
+                  ("WARC-Block-Digest", block_digest)]
+
+        if payload_digest is not None:
+            fields.append(("WARC-Payload-Digest", payload_digest))
+
+        head = "".join(f"{name}: {value}\r\n" for name, value in fields)
+
+        with gzip.GzipFile(fileobj=self._fd, mode="wb") as member:
+            member.write(f"{WARC_VERSION}\r\n{head}\r\n".encode("utf-8"))
+
+            for part in block:
+                for chunk in self.__chunks_of(part):
+                    member.write(chunk)
+
+            member.write(b"\r\n\r\n")
+
+        return record_id
+
+    def __digests_of(self, block, payload):
+        length = 0
+        block_hash = hashlib.sha1()
+        payload_hash = hashlib.sha1() if payload is not None else None
+
+        for part in block:
+            for chunk in self.__chunks_of(part):
+                length += len(chunk)
+                block_hash.update(chunk)
+
+                if part is payload:
+                    payload_hash.update(chunk)
+
+        return (length, _digest_of(block_hash),
+                None if payload_hash is None else _digest_of(payload_hash))
+
+    def __chunks_of(self, part):
+        if isinstance(part, bytes):
+            yield part
+            return
+
+        part.seek(0)
+
+        try:
+            yield from iter(lambda: part.read(self.CHUNK_SIZE), b"")
+        finally:
+            part.seek(0)
+
+
+def _response_head(status, headers, size):
+    try:
+        reason = http.HTTPStatus(status).phrase
+    except ValueError:
+        reason = ""
+
+    lines = [f"HTTP/1.1 {status} {reason}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items()
+                 if name.lower() not in _FRAMING_HEADERS)
+    lines.append(f"content-length: {size}")
+
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+def _request_head(url, headers):
+    parsed_url = urllib.parse.urlsplit(url)
+    target = urllib.parse.urlunsplit(("", "", parsed_url.path or "/", parsed_url.query, ""))
+
+    lines = [f"GET {target} HTTP/1.1", f"host: {parsed_url.netloc}"]
+    lines.extend(f"{name}: {value}" for name, value in (headers or dict()).items())
+
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+
+def _size_of(body):
+    if isinstance(body, bytes):
+        return len(body)
+
+    size = body.seek(0, os.SEEK_END)
+    body.seek(0)
+    return size
+
+
+def _digest_of(sha1):
+    return f"sha1:{base64.b32encode(sha1.digest()).decode('ascii')}"
+
+
+def _warc_date():
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
@@ -4,7 +4,10 @@ from . import container
 from . import client
 
 from .container import Response
+from .container import Download
 from .provider import ClientFactoryProvider
 from .provider import HTTPClientDownloader
 from .provider import HTTPClientDownloadProvider
 from .provider import ClientPool
+from .client import DescriptorBudget
+from .client import RecordingClient
@@ -45,7 +45,7 @@ class AsyncClient(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    async def get_request(self, url) -> container.Response:
+    async def get_request(self, url, headers=None) -> container.Response:
         pass
 
     @abc.abstractmethod
@@ -78,7 +78,7 @@ class AsyncJsClient(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    async def get_request(self, url):
+    async def get_request(self, url, headers=None):
         pass
 
     @abc.abstractmethod
@@ -1,5 +1,7 @@
+import hashlib
 import tempfile
 import asyncio
+import logging
 
 # third party imports
 import aiohttp
@@ -9,17 +11,76 @@ from selenium import webdriver
 from . import container
 from . import exception
 from . import abstract
+import lemmiwinks.singleton as singleton
+
+
+class DescriptorBudget(metaclass=singleton.LoopSingleton):
+    """
+    Process wide budget of the open response bodies. Every response body
+    holds one file descriptor until the response is closed, the clients
+    wait for a free descriptor before they create the body. The wait is
+    bounded by the timeout in seconds, the responses which are not closed
+    exhaust the budget, so the wait fails instead of blocking forever.
+    """
+
+    def __init__(self, max_descriptors=256, timeout=60):
+        self._max_descriptors = max_descriptors
+        self._timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_descriptors)
+
+    async def acquire(self):
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self._timeout)
+        except asyncio.TimeoutError:
+            raise exception.DescriptorBudgetExhausted(
+                f"all {self._max_descriptors} response bodies are open for {self._timeout} "
+                f"seconds, the responses are not closed") from None
+
+    def release(self):
+        self._semaphore.release()
+
+
+class RecordingClient:
+    """
+    Wraps the http client, the received responses are passed to the
+    recorder before they are returned. The recorder has the thread safe
+    record method which gets the URL, the request headers and the response,
+    it is called in the executor, so the body is not written on the event
+    loop.
+    """
+
+    def __init__(self, http_client, recorder):
+        self.__logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
+        self.__http_client = http_client
+        self.__recorder = recorder
+
+    async def get_request(self, url, headers=None):
+        response = await self.__http_client.get_request(url, headers)
+        request_headers = {**(getattr(self.__http_client, "headers", None) or dict()),
+                           **(headers or dict())}
+
+        await asyncio.get_event_loop().run_in_executor(
+            None, self.__record, url, request_headers, response)
+
+        return response
+
+    def __record(self, url, request_headers, response):
+        try:
+            self.__recorder.record(url, request_headers, response)
+        except Exception as e:
+            self.__logger.error(f"Cannot record {url}: {e}")
 
 
 class AIOClient(abstract.AsyncClient):
     def __init__(self, pool_limit=30, timeout=None,
-                 proxy=None, headers=None, cookies=None):
+                 proxy=None, headers=None, cookies=None, descriptor_budget=None):
 
         super().__init__("{}.{}".format(__name__, self.__class__.__name__))
+        self.__descriptor_budget = descriptor_budget or DescriptorBudget()
 
         self.timeout = timeout
         self.proxy = proxy
-        self.header = headers
+        self.headers = headers
         self.cookies = cookies
         self.__chunk_size = 4096
 
@@ -30,26 +91,37 @@ class AIOClient(abstract.AsyncClient):
     def __del__(self):
         self.__session.close()
 
-    async def get_request(self, url) -> container.Response:
+    async def get_request(self, url, headers=None) -> container.Response:
         try:
-            content_descriptor, url_and_status = await self.__get_response_from(url)
+            content_descriptor, url_and_status, response_headers, digest = \
+                await self.__get_response_from(url, headers)
+        except exception.DescriptorBudgetExhausted:
+            raise
         except Exception as e:
             self._logger.error(f"Cannot connect to host {url}")
             raise exception.HTTPClientConnectionFailed(e)
         else:
-            return container.Response(content_descriptor, url_and_status)
+            return container.Response(content_descriptor, url_and_status, response_headers,
+                                      self.__descriptor_budget, digest)
 
-    async def __get_response_from(self, url):
+    async def __get_response_from(self, url, headers):
         async with self.__session.get(url,
-                                      headers=self.headers,
+                                      headers=self.__merge_headers_with(headers),
                                       timeout=self.timeout,
                                       proxy=self.proxy.url,
                                       proxy_auth=self.proxy.auth) as response:
 
             url_and_status = self.__get_url_and_status_from(response)
-            content_descriptor = await self.__get_content_descriptor_from(response)
+            response_headers = {key.lower(): value for key, value in response.headers.items()}
+            content_descriptor, digest = await self.__get_content_descriptor_from(response)
 
-        return content_descriptor, url_and_status
+        return content_descriptor, url_and_status, response_headers, digest
+
+    def __merge_headers_with(self, headers):
+        if headers is None:
+            return self.headers
+        else:
+            return {**(self.headers or dict()), **headers}
 
     @staticmethod
     def __get_url_and_status_from(response):
@@ -59,12 +131,27 @@ class AIOClient(abstract.AsyncClient):
         return url_and_status
 
     async def __get_content_descriptor_from(self, response):
-        content_descriptor = tempfile.NamedTemporaryFile()
+        await self.__descriptor_budget.acquire()
 
-        async for data in response.content.iter_chunked(self.__chunk_size):
-            content_descriptor.write(data)
+        try:
+            content_descriptor = tempfile.NamedTemporaryFile()
+        except BaseException:
+            self.__descriptor_budget.release()
+            raise
 
-        return content_descriptor
+        # the body is hashed while it is received
+        sha256 = hashlib.sha256()
+
+        try:
+            async for data in response.content.iter_chunked(self.__chunk_size):
+                sha256.update(data)
+                content_descriptor.write(data)
+        except BaseException:
+            content_descriptor.close()
+            self.__descriptor_budget.release()
+            raise
+
+        return content_descriptor, sha256.hexdigest()
 
     def post_request(self, url, data):
         pass
@@ -79,8 +166,10 @@ class AIOClient(abstract.AsyncClient):
 
 
 class SeleniumClient(abstract.AsyncJsClient):
-    def __init__(self, executor_url: str, browser_info, timeout=3, cookies=dict()):
+    def __init__(self, executor_url: str, browser_info, timeout=3, cookies=dict(),
+                 descriptor_budget=None):
         super().__init__("{}.{}".format(__name__, self.__class__.__name__))
+        self.__descriptor_budget = descriptor_budget or DescriptorBudget()
         self.__timeout = timeout
         self.cookies = cookies
         self.__driver = webdriver.Remote(
@@ -95,24 +184,34 @@ class SeleniumClient(abstract.AsyncJsClient):
     def cookies(self, cookies: dict):
         self._cookies = cookies
 
-    async def get_request(self, url):
+    async def get_request(self, url, headers=None):
+        # the webdriver does not support the request headers
         try:
             await self.__send_request(url)
-            content_descriptor, url_and_status = self.__get_response()
+            content_descriptor, url_and_status = await self.__get_response()
+        except exception.DescriptorBudgetExhausted:
+            raise
         except Exception as e:
             self._logger.error(f"Cannot connect to host {url}")
             raise exception.HTTPClientConnectionFailed(e)
         else:
-            return container.Response(content_descriptor, url_and_status)
+            return container.Response(content_descriptor, url_and_status,
+                                      descriptor_budget=self.__descriptor_budget)
 
     async def __send_request(self, url):
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, self.__driver.get, url)
         await asyncio.sleep(self.__timeout)
 
-    def __get_response(self):
-        content_descriptor = self.__get_content_descriptor()
-        url_and_status = self.__get_url_and_status()
+    async def __get_response(self):
+        await self.__descriptor_budget.acquire()
+
+        try:
+            content_descriptor = self.__get_content_descriptor()
+            url_and_status = self.__get_url_and_status()
+        except BaseException:
+            self.__descriptor_budget.release()
+            raise
 
         return content_descriptor, url_and_status
 
@@ -5,23 +5,60 @@ import tempfile
 
 Proxy = collections.namedtuple("Proxy", "url login password")
 AIOProxy = collections.namedtuple("_AIOProxy", "url auth")
+Download = collections.namedtuple("Download", "status digest headers size")
 
 
 class Response:
-    def __init__(self, content_descriptor=None, url_and_status=list()):
+    """
+    Response with the body in the content descriptor. The descriptor is
+    closed by the close method or at the exit of the with statement, the
+    optional descriptor budget gets the descriptor back by the close. The
+    optional digest is the SHA-256 of the body computed while it was
+    received.
+    """
+
+    def __init__(self, content_descriptor=None, url_and_status=list(), headers=None,
+                 descriptor_budget=None, digest=None):
         self.__logger = logging.getLogger("{}.{}".format(__name__, __class__.__name__))
         self.__content_descriptor = None
         self.__url_and_status = None
+        self.__descriptor_budget = descriptor_budget
+        self.digest = digest
 
         self.url_and_status = url_and_status
         self.content_descriptor = content_descriptor
+        # the names of the headers are lower case
+        self.headers = headers if headers is not None else dict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def __del__(self):
         try:
-            self.__content_descriptor.close()
+            self.close()
         except Exception as e:
             self.__logger.warning(e)
 
+    def close(self):
+        try:
+            if self.__content_descriptor is not None:
+                self.__content_descriptor.close()
+        finally:
+            self.__release_descriptor()
+
+    def __release_descriptor(self):
+        descriptor_budget, self.__descriptor_budget = self.__descriptor_budget, None
+
+        if descriptor_budget is not None:
+            descriptor_budget.release()
+
+    @property
+    def closed(self):
+        return self.__content_descriptor is None or self.__content_descriptor.closed
+
     @property
     def content_descriptor(self):
         return self.__content_descriptor
@@ -49,6 +86,16 @@ class Response:
         finally:
             return url
 
+    @property
+    def status(self):
+        try:
+            _, status = self.url_and_status[-1]
+        except Exception as e:
+            status = None
+            self.__logger.error(e)
+        finally:
+            return status
+
     @property
     def accessed_url(self):
         try:
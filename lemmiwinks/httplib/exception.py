@@ -10,6 +10,10 @@ class PoolError(HTTPClientError):
     pass
 
 
+class DescriptorBudgetExhausted(HTTPClientError):
+    pass
+
+
 class URLResolverError(HTTPClientError):
     pass
 
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import asyncio
 import asyncio_extras
@@ -10,6 +11,7 @@ from selenium.webdriver import DesiredCapabilities
 # local imports
 from . import client
 from . import exception
+from .container import Download
 from .container import InstanceStatus
 import lemmiwinks.singleton as singleton
 
@@ -48,19 +50,34 @@ class HTTPClientDownloader:
         self._logger = logging.getLogger(f"{__name__}{__class__.__name__}")
         self.__http_client = http_client
 
-    async def download(self, url: str, dst: str) -> None:
+    async def download(self, url: str, dst: str) -> Download:
         try:
             response = await self.__http_client.get_request(url)
-            self.__save_response_content_to(response, dst)
+
+            with response:
+                digest, size = self.__save_response_content_to(response, dst)
         except Exception as e:
             self._logger.error(f"error: {e}")
             self._logger.error(f"url: {url}")
             self._logger.error(f"dst: {dst}")
+            return Download(None, None, dict(), None)
+        else:
+            return Download(response.status, digest, response.headers, size)
 
     @staticmethod
-    def __save_response_content_to(response, destination):
+    def __save_response_content_to(response, destination, chunk_size=65536):
+        # the content is hashed while it is copied, so the stored file
+        # is read only once
+        sha256 = hashlib.sha256()
+        source = response.content_descriptor
+        size = 0
+
         with open(destination, "wb") as fd:
-            fd.write(response.content_descriptor.read())
+            for chunk in iter(lambda: source.read(chunk_size), b""):
+                sha256.update(chunk)
+                size += fd.write(chunk)
+
+        return sha256.hexdigest(), size
 
 
 class HTTPClientDownloadProvider:
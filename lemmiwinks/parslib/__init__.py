@@ -2,6 +2,8 @@ from . import parser
 from . import abstract
 from . import provider
 from . import exception
+from . import cache
+from . import pool
 
 from .abstract import CSSParser
 from .abstract import HTMLParser
@@ -10,3 +12,6 @@ from .abstract import Element
 
 from .provider import HTMLParserProvider
 from .provider import CSSParserProvider
+
+from .cache import StylesheetCache
+from .pool import ParserPool
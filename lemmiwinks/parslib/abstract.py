@@ -65,6 +65,8 @@ class HTMLParser(metaclass=abc.ABCMeta):
 
 
 class Token(metaclass=abc.ABCMeta):
+    __slots__ = ("_token",)
+
     def __init__(self, token):
         self._token = token
 
@@ -0,0 +1,57 @@
+import collections
+import hashlib
+import threading
+
+import lemmiwinks.singleton as singleton
+
+from . import parser
+
+
+class StylesheetCache(metaclass=singleton.ThreadSafeSingleton):
+    """
+    Process wide LRU cache of parsed stylesheets. The entries are keyed by
+    the hash of the stylesheet content and its base URL and they hold the
+    serialized template of the stylesheet, so a repeated stylesheet does not
+    have to be parsed by tinycss2 again.
+    """
+
+    def __init__(self, max_entries=128):
+        self._max_entries = max_entries
+        self._templates = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content: bytes, url: str):
+        key = self.__key_for(content, url)
+
+        with self._lock:
+            template = self._templates.get(key)
+
+            if template is not None:
+                self._templates.move_to_end(key)
+
+        if template is None:
+            return None
+        else:
+            return parser.TemplateCSSParser(template)
+
+    def put(self, content: bytes, url: str, template: parser.CSSTemplate):
+        key = self.__key_for(content, url)
+
+        with self._lock:
+            self._templates[key] = template
+            self._templates.move_to_end(key)
+
+            while len(self._templates) > self._max_entries:
+                self._templates.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def __len__(self):
+        return len(self._templates)
+
+    @staticmethod
+    def __key_for(content, url):
+        digest = hashlib.sha256(content).hexdigest()
+        return digest, url
@@ -1,7 +1,10 @@
+import re
+import uuid
 from typing import List, Dict
 
 # third party imports
 import tinycss2
+import tinycss2.serializer
 
 # local imports
 from . import abstract
@@ -17,61 +20,41 @@ class TinyCSSParser(abstract.CSSParser):
 
     def parse_tokens(self):
         try:
-            for rule in self._parser:
-                self.__search_tokens_in(rule)
+            self.__search_tokens_in(self._parser)
         except Exception as e:
             self._logger.error(e)
 
-    def __search_tokens_in(self, rule):
-        try:
-            if self.__is_declaration(rule):
-                [self.__process_rule(component_value) for component_value in rule.value]
-            # @import url;
-            # @import url list-of-media-queries;
-            elif self.__is_import(rule):
-                self.__process_import(rule)
-            elif self.__is_at_rule(rule) or self.__is_qualified_rule(rule):
-                [self.__process_rule(component_value) for component_value in rule.prelude]
-                [self.__process_rule(rule) for rule in rule.content]
-        except TypeError:
-            # (Some object are not iterable for example <AtRule @import … { … }>)
-            pass
-        except AttributeError:
-            # The exception is raised during the parsing when
-            # the parser processes the CSS token which is not stored.
-            pass
-        except Exception as e:
-            self._logger.error("Unexpected error during parsing {}\n{}".format(e, rule))
-            raise exception.ParserError(e)
+    def __search_tokens_in(self, rules):
+        # The rules are walked with an explicit stack of iterators instead
+        # of the recursion. The prelude iterator is pushed after the content
+        # iterator, so the tokens are found in the order of the stylesheet.
+        stack = [iter(rules)]
 
-    @staticmethod
-    def __is_declaration(rule):
-        return rule.type == "declaration"
+        while stack:
+            node = next(stack[-1], None)
 
-    @staticmethod
-    def __is_at_rule(rule):
-        return rule.type == "at-rule"
+            if node is None:
+                stack.pop()
+                continue
 
-    @staticmethod
-    def __is_qualified_rule(rule):
-        return rule.type == "qualified-rule"
+            node_type = node.type
 
-    def __process_rule(self, rule):
-        try:
             # url("http://mysite.example.com/mycursor.png")
             # url('http://mysite.example.com/mycursor.png')
             # url(http://mysite.example.com/mycursor.png)
-            if self.__is_url_token(rule):
-                self.__process_url_token(rule)
-            # indirect recursion, parse rule to sub-rules and analyze
-            else:
-                [self.__process_rule(value) for value in rule.value]
-        except Exception:
-            pass
-
-    @staticmethod
-    def __is_import(rule):
-        return rule.type == "at-rule" and rule.lower_at_keyword == "import"
+            if node_type == "url":
+                self.__process_url_token(node)
+            elif node_type == "declaration":
+                stack.append(iter(node.value))
+            # @import url;
+            # @import url list-of-media-queries;
+            elif node_type == "at-rule" and node.lower_at_keyword == "import":
+                self.__process_import(node)
+            elif node_type == "at-rule" or node_type == "qualified-rule":
+                # (Some at-rules have no content, for example <AtRule @charset …>)
+                if node.content is not None:
+                    stack.append(iter(node.content))
+                stack.append(iter(node.prelude))
 
     def __process_import(self, rule):
         # Component value:
@@ -85,39 +68,77 @@ class TinyCSSParser(abstract.CSSParser):
         # Any token produced by the tokenizer except for <function-token>s,
         # <{-token>s, <(-token>s, and <[-token>s.
         for component_value in rule.prelude:
-            self.__process_component_value(component_value)
+            if component_value.type == "string" or component_value.type == "url":
+                self._import_token_list.append(TinyToken(component_value))
 
-    def __process_component_value(self, component_value):
-        if self.__is_string_token(component_value) or self.__is_url_token(
-                component_value):
-            self._import_token_list.append(TinyToken(component_value))
-        else:
-            self.__search_tokens_in(component_value)
+    def __process_url_token(self, token):
+        # An image can be represented as raw data written inside the URL.
+        # In this case, URL starts with "data:image" prefix.
+        if not token.value[:10].lower().startswith("data:image"):
+            self._url_token_list.append(TinyToken(token))
 
-    @staticmethod
-    def __is_string_token(rule):
-        return rule.type == "string"
+    def export(self):
+        return tinycss2.serialize(self._parser)
 
-    @staticmethod
-    def __is_url_token(rule):
-        return rule.type == "url"
+    def template(self):
+        # Every token value is replaced by an unique placeholder for the
+        # time of serialization, the placeholders split the output to
+        # the static parts and the slots for the token values.
+        tokens = self._url_token_list + self._import_token_list
+        values = [token.value for token in tokens]
+        nonce = uuid.uuid4().hex
 
-    def __process_url_token(self, token):
-        if self.__is_token_value_url(token):
-            self._url_token_list.append(TinyToken(token))
+        try:
+            for index, token in enumerate(tokens):
+                token.value = f"lw{nonce}-{index}-"
+            fragments = re.split(f"lw{nonce}-(\\d+)-", self.export())
+        finally:
+            for token, value in zip(tokens, values):
+                token.value = value
 
-    @staticmethod
-    def __is_token_value_url(token):
-        # An image can be represented as raw data written inside the URL.
-        # In this case, URL starts with "data:image" prefix.
-        return token.value.lower().startswith("data:image") is False
+        url_count = len(self._url_token_list)
+        return CSSTemplate(fragments, values[:url_count], values[url_count:])
+
+
+class CSSTemplate:
+    """
+    Serialized stylesheet with the slots for url and import token values.
+    The fragments list alternates static text and slot indexes (as strings),
+    the slots are numbered over url tokens followed by import tokens.
+    """
+
+    def __init__(self, fragments, url_values, import_values):
+        self.fragments = fragments
+        self.url_values = url_values
+        self.import_values = import_values
+
+    def render(self, values):
+        rendered = list(self.fragments)
+
+        for index in range(1, len(rendered), 2):
+            value = values[int(rendered[index])]
+            rendered[index] = tinycss2.serializer.serialize_string_value(value)
+
+        return "".join(rendered)
 
-    def __process_declaration(self, rule):
-        for component_value in rule.value:
-            self.__search_tokens_in(component_value)
+
+class TemplateCSSParser(abstract.CSSParser):
+    def __init__(self, template):
+        logger_name = f"{__name__}.{self.__class__.__name__}"
+        super().__init__(template, logger_name)
+        self._url_token_list = [TemplateToken(value) for value in template.url_values]
+        self._import_token_list = [TemplateToken(value) for value in template.import_values]
+
+    def parse_tokens(self):
+        # tokens are already known from the template
+        pass
 
     def export(self):
-        return tinycss2.serialize(self._parser)
+        tokens = self._url_token_list + self._import_token_list
+        return self._parser.render([token.value for token in tokens])
+
+    def template(self):
+        return self._parser
 
 
 class BsHTMLParser(abstract.HTMLParser):
@@ -169,6 +190,151 @@ class BsHTMLParser(abstract.HTMLParser):
     def export(self):
         return self._soup.prettify(DEFAULT_ENCODING)
 
+    def plan(self, queries) -> "HTMLPlan":
+        # The elements are identified by their position in the document,
+        # the same data parsed again gives the same positions.
+        positions = {id(tag): position
+                     for position, tag in enumerate(self._soup.find_all(True))}
+        html_plan = HTMLPlan(self.charset)
+
+        for tag, attribute in queries:
+            key = query_key(tag, attribute)
+            html_plan.queries[key] = [html_plan.add(positions[id(element)], element)
+                                      for element in self._soup.find_all(tag, attribute)]
+
+        if self._soup.title is not None:
+            html_plan.title = html_plan.add(positions[id(self._soup.title)], self._soup.title)
+
+        if self._soup.base is not None:
+            html_plan.base = html_plan.add(positions[id(self._soup.base)], self._soup.base)
+
+        return html_plan
+
+    def rewrite(self, rewrites: "HTMLRewrites"):
+        tags = self._soup.find_all(True)
+
+        for position, attrs in rewrites.attrs.items():
+            tags[position].attrs.update(attrs)
+
+        for position, string in rewrites.strings.items():
+            tags[position].string = string
+
+        if rewrites.delete_base:
+            del self.base
+
+
+def query_key(tag, attribute):
+    if attribute is None:
+        return tag, ()
+    else:
+        return tag, tuple(sorted(attribute.items(), key=lambda item: item[0]))
+
+
+class HTMLPlan:
+    """
+    Picklable description of a parsed document. It holds the elements
+    matched by the planned queries, the title, base element and charset.
+    The elements are stored by their position in the document as a tuple
+    of the element name, attributes and string.
+    """
+
+    def __init__(self, charset=None):
+        self.charset = charset
+        self.title = None
+        self.base = None
+        self.elements = dict()
+        self.queries = dict()
+
+    def add(self, position, element):
+        if position not in self.elements:
+            string = element.string
+
+            if string is not None:
+                string = str(string)
+
+            self.elements[position] = (element.name, dict(element.attrs), string)
+
+        return position
+
+
+class HTMLRewrites:
+    """
+    Picklable description of the changes of a planned document, the
+    changed attributes and strings are stored by the element position.
+    """
+
+    def __init__(self):
+        self.attrs = dict()
+        self.strings = dict()
+        self.delete_base = False
+
+
+class PlannedHTMLParser(abstract.HTMLParser):
+    """
+    HTML parser built from the HTMLPlan. The queries are answered from the
+    plan, the changes of the elements are collected to the HTMLRewrites and
+    applied to the document again during the export.
+    """
+
+    def __init__(self, data, html_plan: HTMLPlan, renderer):
+        logger_name = f"{__name__}.{__class__.__name__}"
+        super().__init__(logger_name)
+        self._data = data
+        self._plan = html_plan
+        self._renderer = renderer
+        self._rewrites = HTMLRewrites()
+        self._elements = {position: PlannedElement(position, *element, self._rewrites)
+                          for position, element in html_plan.elements.items()}
+
+    @property
+    def data(self):
+        return self._data
+
+    @property
+    def rewrites(self):
+        return self._rewrites
+
+    def find_elements(self, tag, attribute: Dict = {}) -> List[abstract.Element]:
+        try:
+            positions = self._plan.queries[query_key(tag, attribute)]
+        except KeyError:
+            self._logger.error(f"query {tag} {attribute} is not planned")
+            return list()
+        else:
+            return [self._elements[position] for position in positions]
+
+    @property
+    def title(self):
+        return self.__get_planned_element(self._plan.title)
+
+    @property
+    def base(self):
+        if self._rewrites.delete_base:
+            return None
+        else:
+            return self.__get_planned_element(self._plan.base)
+
+    @base.deleter
+    def base(self):
+        self._rewrites.delete_base = True
+
+    def __get_planned_element(self, position):
+        if position is None:
+            return None
+        else:
+            return self._elements[position]
+
+    @property
+    def charset(self):
+        return self._plan.charset
+
+    @property
+    def text(self):
+        raise exception.HTMLParseError("The text is not planned.")
+
+    def export(self):
+        return self._renderer(self._data, self._rewrites)
+
 
 class BsElement(abstract.Element):
     def __init__(self, element):
@@ -200,7 +366,45 @@ class BsElement(abstract.Element):
         return self._element.attrs
 
 
+class PlannedElement(abstract.Element):
+    def __init__(self, position, name, attrs, string, rewrites):
+        super().__init__(position)
+        self._name = name
+        self._attrs = attrs
+        self._string = string
+        self._rewrites = rewrites
+
+    def __str__(self):
+        return f"<{self._name} {self._attrs}>"
+
+    def __getitem__(self, item):
+        return self._attrs.get(item)
+
+    def __setitem__(self, key, value):
+        self._attrs.update({key: value})
+        self._rewrites.attrs.setdefault(self._element, dict()).update({key: value})
+
+    @property
+    def name(self):
+        return self._name
+
+    @property
+    def string(self):
+        return self._string
+
+    @string.setter
+    def string(self, string):
+        self._string = string
+        self._rewrites.strings.update({self._element: string})
+
+    @property
+    def attrs(self):
+        return self._attrs
+
+
 class TinyToken(abstract.Token):
+    __slots__ = ()
+
     def __init__(self, token):
         super().__init__(token)
 
@@ -214,3 +418,21 @@ class TinyToken(abstract.Token):
     @value.setter
     def value(self, value):
         self._token.value = value
+
+
+class TemplateToken(abstract.Token):
+    __slots__ = ()
+
+    def __init__(self, value):
+        super().__init__(value)
+
+    def __str__(self):
+        return str(self._token)
+
+    @property
+    def value(self):
+        return self._token
+
+    @value.setter
+    def value(self, value):
+        self._token = value
@@ -0,0 +1,46 @@
+import asyncio
+import concurrent.futures
+
+import lemmiwinks.singleton as singleton
+
+from . import parser
+from .provider import PlannedParserProvider
+
+
+class ParserPool(metaclass=singleton.ThreadSafeSingleton):
+    """
+    Runs the parse and serialize steps in a process pool, so the event loop
+    is not blocked by big documents. Only the plan of a document and the
+    rewrites of its elements are passed between the processes.
+    """
+
+    def __init__(self, max_workers=None):
+        self._executor = concurrent.futures.ProcessPoolExecutor(max_workers)
+
+    def __del__(self):
+        self._executor.shutdown(wait=False)
+
+    async def html_parser(self, data: bytes, queries) -> parser.PlannedHTMLParser:
+        html_plan = await self.__run(PlannedParserProvider.html_plan, data, queries)
+        return parser.PlannedHTMLParser(data, html_plan, PlannedParserProvider.render_html)
+
+    async def css_parser(self, data, declaration=False) -> parser.TemplateCSSParser:
+        template = await self.__run(PlannedParserProvider.css_template, data, declaration)
+        return parser.TemplateCSSParser(template)
+
+    async def css_parsers(self, data_list, declaration=False):
+        templates = await self.__run(
+            PlannedParserProvider.css_templates, data_list, declaration)
+        return [None if template is None else parser.TemplateCSSParser(template)
+                for template in templates]
+
+    async def export(self, planned_parser):
+        if isinstance(planned_parser, parser.PlannedHTMLParser):
+            return await self.__run(PlannedParserProvider.render_html,
+                                    planned_parser.data, planned_parser.rewrites)
+        else:
+            return planned_parser.export()
+
+    async def __run(self, func, *args):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
@@ -1,3 +1,4 @@
+import io
 import tinycss2
 import bs4
 import logging
@@ -34,3 +35,43 @@ class HTMLParserProvider:
     def bs_parser(cls, data):
         soup = bs4.BeautifulSoup(data, 'lxml')
         return parser.BsHTMLParser(soup)
+
+
+class PlannedParserProvider:
+    """
+    Parse and serialize steps of the planned parsers. The methods take and
+    return only picklable data, so they can run in another process.
+    """
+
+    @classmethod
+    def html_plan(cls, data, queries):
+        html_parser = HTMLParserProvider.bs_parser(data)
+        return html_parser.plan(queries)
+
+    @classmethod
+    def render_html(cls, data, rewrites):
+        html_parser = HTMLParserProvider.bs_parser(data)
+        html_parser.rewrite(rewrites)
+        return html_parser.export()
+
+    @classmethod
+    def css_template(cls, data, declaration=False):
+        if isinstance(data, bytes):
+            data = io.BytesIO(data)
+
+        css_parser = CSSParserProvider.tinycss_parser(data, declaration)
+        css_parser.parse_tokens()
+        return css_parser.template()
+
+    @classmethod
+    def css_templates(cls, data_list, declaration=False):
+        # the data which cannot be parsed gets None, the others are kept
+        return [cls.__css_template_or_none(data, declaration) for data in data_list]
+
+    @classmethod
+    def __css_template_or_none(cls, data, declaration):
+        try:
+            return cls.css_template(data, declaration)
+        except Exception as e:
+            logging.error(f"PlannedParserProvider error: {e}")
+            return None
@@ -1,3 +1,6 @@
+import base64
+import hashlib
+import os
 import pathlib
 import uuid
 import logging
@@ -34,6 +37,27 @@ class DirectoryWrapper:
         return self._dirpath.joinpath(filename)
 
 
+class ContentAddressedDirectory(DirectoryWrapper):
+    """
+    Directory which stores every content once under its digest. The path
+    of the content is given by its digest and extension, so the same
+    content is kept only once.
+    """
+
+    def path_of(self, digest: str, extension: str) -> pathlib.Path:
+        return self._dirpath.joinpath(f"{digest}{extension}")
+
+
+def file_digest(filepath, chunk_size=65536) -> str:
+    sha256 = hashlib.sha256()
+
+    with open(filepath, "rb") as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+
 class FilePathGenerator:
     def __init__(self, directory: object, path_prefix: str):
         self._logger = logging.getLogger(f"{__name__}.{self.__class__.__name__}")
@@ -45,8 +69,15 @@ class FilePathGenerator:
         return str(abs_path)
 
     def get_relpath_from(self, abs_path: str) -> str:
+        # the placeholders such as about:blank are kept as they are
+        if not pathlib.Path(abs_path).is_absolute():
+            return abs_path
+
         try:
             relpath = str(pathlib.Path(abs_path).relative_to(self._path_prefix))
+        except ValueError:
+            # the file stored by other tab of the archive
+            return os.path.relpath(abs_path, self._path_prefix)
         except Exception as e:
             self._logger.exception(e)
             self._logger.error(f"absolute path: {abs_path}")
@@ -54,6 +85,13 @@ class FilePathGenerator:
         else:
             return relpath
 
+    def content_path(self, abs_path: str, digest: str) -> str:
+        # the path of the content with the digest, the content is not moved
+        if not isinstance(self._directory, ContentAddressedDirectory):
+            return abs_path
+
+        extension = pathlib.Path(abs_path).suffix
+        return str(self._directory.path_of(digest, extension))
 
     def __generate_abs_filepath_with(self, extension: str) -> pathlib.Path:
         return self._directory.get_filepath_with(extension)
@@ -65,6 +103,21 @@ class FilePathProvider:
         directory = DirectoryWrapper(location)
         return FilePathGenerator(directory, path_prefix)
 
+    @classmethod
+    def content_addressed_filepath_generator(cls, location, path_prefix):
+        directory = ContentAddressedDirectory(location)
+        return FilePathGenerator(directory, path_prefix)
+
+
+def data_uri_from(filepath, url) -> str:
+    url_path = urllib.parse.urlparse(url).path
+    mime_type = mimetypes.guess_type(url_path)[0] or magic.from_file(filepath, mime=True)
+
+    with open(filepath, "rb") as fd:
+        data = base64.b64encode(fd.read()).decode("ascii")
+
+    return f"data:{mime_type};base64,{data}"
+
 
 class MimeFileExtension:
     def __init__(self, filepath, url):
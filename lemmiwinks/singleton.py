@@ -1,3 +1,4 @@
+import asyncio
 import threading
 
 
@@ -20,3 +21,25 @@ class ThreadSafeSingleton(type):
                 cls._instances[cls] = super(ThreadSafeSingleton, cls).__call__(*args,
                                                                                **kwargs)
             return cls._instances[cls]
+
+
+class LoopSingleton(type):
+    # one instance for every event loop, for the classes holding the asyncio
+    # primitives bound to the loop, the instances of the closed loops are
+    # dropped once the instance of other loop is created
+    _instances = dict()
+    _lock = threading.Lock()
+
+    def __call__(cls, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+
+        with LoopSingleton._lock:
+            instances = cls._instances.setdefault(cls, dict())
+
+            if loop not in instances:
+                for closed_loop in [other for other in instances if other.is_closed()]:
+                    del instances[closed_loop]
+
+                instances[loop] = super(LoopSingleton, cls).__call__(*args, **kwargs)
+
+            return instances[loop]
@@ -1,4 +1,12 @@
 import asyncio
+import enum
+import heapq
+import itertools
+import time
+
+import asyncio_extras
+
+from . import singleton
 
 
 def task(func):
@@ -6,3 +14,121 @@ def task(func):
         task = asyncio.get_event_loop().create_task(func(*args, **kwargs))
         return task
     return wrapper
+
+
+class Stage(enum.Enum):
+    FETCH = enum.auto()
+    PARSE = enum.auto()
+    WRITE = enum.auto()
+
+
+class PriorityGate:
+    """
+    Semaphore which wakes up the waiters in the order of their priority,
+    the lower value goes first. The waiters of the same priority are woken
+    up in the order of arrival.
+    """
+
+    def __init__(self, limit: int):
+        self._limit = limit
+        self._active = 0
+        self._waiters = list()
+        self._counter = itertools.count()
+
+    async def acquire(self, priority=0):
+        if self._active < self._limit and not self._waiters:
+            self._active += 1
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            # the slot was already handed over to the cancelled waiter
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+
+            if not future.done():
+                # the slot is handed over, the number of active stays same
+                future.set_result(None)
+                return
+
+        self._active -= 1
+
+
+class Scheduler(metaclass=singleton.LoopSingleton):
+    """
+    Scheduler of the migration work shared by the jobs of the event loop,
+    its gates are bound to the loop. The fetch, parse and write
+    stages have their own bounded gates, the waiting work is started in the
+    order of its priority. The gather method starts the coroutines lazily
+    and runs at most task_limit of them at the same time.
+    """
+
+    def __init__(self, fetch_limit=30, parse_limit=4, write_limit=8, task_limit=64):
+        self._task_limit = task_limit
+        self._gates = {Stage.FETCH: PriorityGate(fetch_limit),
+                       Stage.PARSE: PriorityGate(parse_limit),
+                       Stage.WRITE: PriorityGate(write_limit)}
+
+    @asyncio_extras.async_contextmanager
+    async def slot(self, stage: Stage, priority=0):
+        gate = self._gates[stage]
+        await gate.acquire(priority)
+
+        try:
+            yield
+        finally:
+            gate.release()
+
+    async def gather(self, coroutines):
+        # the workers share one iterator, so every coroutine is created
+        # and awaited only once and only when a worker is free, a worker
+        # is started only for one of the first task_limit coroutines
+        iterator = iter(coroutines)
+
+        async def worker(coroutine):
+            while coroutine is not None:
+                await coroutine
+                coroutine = next(iterator, None)
+
+        await asyncio.gather(*[worker(coroutine)
+                               for coroutine in itertools.islice(iterator, self._task_limit)])
+
+
+class Deadline:
+    """
+    Time budget of one job. The remaining time of the job bounds all of its
+    work, the optional stage timeouts bound every single piece of work of
+    the stage. Without the timeout the budget is not limited.
+    """
+
+    def __init__(self, timeout=None, stage_timeouts=None):
+        self._expires = None if timeout is None else time.monotonic() + timeout
+        self._stage_timeouts = dict(stage_timeouts or dict())
+
+    @property
+    def remaining(self):
+        if self._expires is None:
+            return None
+        else:
+            return max(self._expires - time.monotonic(), 0)
+
+    @property
+    def expired(self):
+        return self.remaining == 0
+
+    def timeout_for(self, stage: Stage = None):
+        timeouts = [timeout for timeout in (self.remaining, self._stage_timeouts.get(stage))
+                    if timeout is not None]
+        return min(timeouts) if timeouts else None
+
+    async def wait_for(self, awaitable, stage: Stage = None):
+        return await asyncio.wait_for(awaitable, self.timeout_for(stage))
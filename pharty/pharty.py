@@ -20,6 +20,7 @@ logging.basicConfig(level=logging.INFO,
 class ArchiveSettings(migration.MigrationSettings):
     http_client = httplib.provider.ClientFactoryProvider.aio_factory.singleton_client
     css_parser = parslib.provider.CSSParserProvider.tinycss_parser
+    css_cache = parslib.StylesheetCache
     html_parser = parslib.provider.HTMLParserProvider.bs_parser
     resolver = httplib.resolver.URLResolver
     path_gen = pathgen.FilePathProvider.filepath_generator
@@ -54,7 +55,9 @@ class AIOLemmiwinks(lemmiwinks.Lemmiwinks):
     @taskwrapper.task
     async def __archive_task(self, url, archive_name):
         response = await self.__get_request(url)
-        await self.__archive_response(response, archive_name)
+
+        with response:
+            await self.__archive_response(response, archive_name)
 
     async def __get_request(self, url):
         if self.__mode == LemiMode.NORMAL:
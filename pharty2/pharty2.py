@@ -61,6 +61,7 @@ class InfoTabLetter(archive.abstract.BaseLetter):
 class ArchiveSettings(migration.MigrationSettings):
     http_client = httplib.provider.ClientFactoryProvider.aio_factory.singleton_client
     css_parser = parslib.provider.CSSParserProvider.tinycss_parser
+    css_cache = parslib.StylesheetCache
     html_parser = parslib.provider.HTMLParserProvider.bs_parser
     resolver = httplib.resolver.URLResolver
     path_gen = pathgen.FilePathProvider.filepath_generator
@@ -110,7 +111,12 @@ class AIOPharty(lemmiwinks.Lemmiwinks):
             self.__add_info_tab_to_envelop(web_content_response)
         ]
 
-        await asyncio.gather(*tasks)
+        # the letter of the web page closes the response once it is written
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            web_content_response.close()
+            raise
 
     async def __add_web_page_to_envelop(self, web_content_response):
         letter = archive.SaveResponseLetter(
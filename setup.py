@@ -8,7 +8,7 @@ setup(name='lemmiwinks',
       licence="MIT",
       classifiers=[
           'License :: OSI Approved :: MIT License',
-          'Programming Language :: Python :: 3.6',
+          'Programming Language :: Python :: 3.7',
       ],
       install_requires=[
           'tinycss2>=0.6.1',
@@ -23,6 +23,9 @@ setup(name='lemmiwinks',
           'lxml>=4.2.0',
           'Jinja2>=2.10',
       ],
+      extras_require={
+          'zstd': ['zstandard>=0.11'],
+      },
       include_package_data=True,
       zip_safe=False,
       )
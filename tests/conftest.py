@@ -0,0 +1,10 @@
+import os
+import sys
+
+# the tests import the package and the helper modules of the tests directory
+# whether pytest runs from the repository root or from the tests directory
+_TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+for _path in (os.path.dirname(_TESTS_DIR), _TESTS_DIR):
+    if _path not in sys.path:
+        sys.path.insert(0, _path)
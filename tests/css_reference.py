@@ -0,0 +1,86 @@
+"""
+Reference of the recursive token search of the TinyCSSParser, as it was
+before the rules were walked iteratively. It is the oracle of the parser
+equivalence test and the baseline of the parser benchmark.
+"""
+import tinycss2
+
+SAMPLE_STYLESHEETS = [
+    'body{background:url(img/a.png)}',
+    'p{background:url("img/b.png") no-repeat, url(\'img/c.png\')}',
+    '.x{background:url(data:image/png;base64,iVBORw0KGgo=)} .y{cursor:url(c.cur), auto}',
+    '@import "a.css";\n@import url(b.css) screen;\n@import url("c.css") print, tv;',
+    '@charset "utf-8";\n@import "d.css";\nh1{list-style:url(bullet.gif)}',
+    '@media screen{.a{background:url(m.png)}}\n.b{background:url(n.png)}',
+    '@font-face{font-family:F;src:url(f.woff2) format("woff2"),url(f.woff) format("woff")}',
+    '.i{background-image:image-set(url(i1.png) 1x, url(i2.png) 2x)}',
+    '/* url(comment.png) */ .c{color:red} .d{background:url( spaced.png )}',
+    '.e{background:url(unterminated.png}\n.f{background:url(after.png)}',
+    '@page :first{background:url(page.png)} @supports (display:grid){.g{background:url(s.png)}}',
+    '.h{content:"url(string.png)";background:URL(upper.png)}',
+    '',
+]
+
+SAMPLE_DECLARATIONS = [
+    'background:url(a.png)',
+    'background:url("b.png") no-repeat; cursor:url(c.cur), pointer',
+    'color:red; background:url(data:image/gif;base64,R0lGOD==)',
+    'background:url(',
+    '',
+]
+
+
+def parse_stylesheet(data):
+    return tinycss2.parse_stylesheet(data, skip_comments=True, skip_whitespace=True)
+
+
+def parse_declarations(data):
+    return tinycss2.parse_declaration_list(data, skip_comments=True, skip_whitespace=True)
+
+
+def recursive_tokens(rules):
+    """
+    Returns the values of the url and import tokens found in the rules.
+    """
+    url_tokens, import_tokens = list(), list()
+
+    for rule in rules:
+        _search_tokens_in(rule, url_tokens, import_tokens)
+
+    return url_tokens, import_tokens
+
+
+def _search_tokens_in(rule, url_tokens, import_tokens):
+    try:
+        if rule.type == "declaration":
+            for component_value in rule.value:
+                _process_rule(component_value, url_tokens)
+        elif rule.type == "at-rule" and rule.lower_at_keyword == "import":
+            for component_value in rule.prelude:
+                _process_component_value(component_value, url_tokens, import_tokens)
+        elif rule.type == "at-rule" or rule.type == "qualified-rule":
+            for component_value in rule.prelude:
+                _process_rule(component_value, url_tokens)
+            for component_value in rule.content:
+                _process_rule(component_value, url_tokens)
+    except (TypeError, AttributeError):
+        pass
+
+
+def _process_rule(rule, url_tokens):
+    try:
+        if rule.type == "url":
+            if not rule.value.lower().startswith("data:image"):
+                url_tokens.append(rule.value)
+        else:
+            for value in rule.value:
+                _process_rule(value, url_tokens)
+    except Exception:
+        pass
+
+
+def _process_component_value(component_value, url_tokens, import_tokens):
+    if component_value.type == "string" or component_value.type == "url":
+        import_tokens.append(component_value.value)
+    else:
+        _search_tokens_in(component_value, url_tokens, import_tokens)
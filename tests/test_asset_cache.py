@@ -0,0 +1,65 @@
+"""
+Checks the reference counting of the content addressed objects of the
+asset cache.
+"""
+import atexit
+import io
+import pathlib
+import tempfile
+import unittest
+
+import lemmiwinks.httplib as httplib
+import lemmiwinks.singleton as singleton
+from lemmiwinks.archive.migration import cache
+
+
+def _response(body, etag=None):
+    headers = dict() if etag is None else {"etag": etag}
+    return httplib.Response(io.BytesIO(body), [("http://example.test/a.png", 200)], headers)
+
+
+class AssetCacheTest(unittest.TestCase):
+    URL = "http://example.test/a.png"
+
+    def setUp(self):
+        # the cache is a singleton, every test gets one of its own
+        singleton.ThreadSafeSingleton._instances.pop(cache.AssetCache, None)
+        self.__directory = tempfile.TemporaryDirectory()
+        self.cache = cache.AssetCache(self.__directory.name)
+
+    def tearDown(self):
+        atexit.unregister(self.cache.sync)
+        singleton.ThreadSafeSingleton._instances.pop(cache.AssetCache, None)
+        self.__directory.cleanup()
+
+    def test_put_unchanged_body_twice(self):
+        self.cache.put(self.URL, _response(b"body", '"v1"'))
+        self.cache.put(self.URL, _response(b"body", '"v2"'))
+
+        entry = self.cache.lookup(self.URL)
+        self.assertIsNotNone(entry)
+        self.assertEqual(entry.etag, '"v2"')
+        self.assertEqual(self.cache.size, len(b"body"))
+        self.assertTrue(pathlib.Path(self.cache.fresh_object(self.URL)[0]).exists())
+
+    def test_put_changed_body_releases_old_object(self):
+        self.cache.put(self.URL, _response(b"old"))
+        old_path = pathlib.Path(self.cache.fresh_object(self.URL)[0])
+        self.cache.put(self.URL, _response(b"new body"))
+
+        self.assertFalse(old_path.exists())
+        self.assertEqual(self.cache.size, len(b"new body"))
+        self.assertTrue(pathlib.Path(self.cache.fresh_object(self.URL)[0]).exists())
+
+    def test_shared_object_outlives_one_url(self):
+        other = "http://example.test/b.png"
+        self.cache.put(self.URL, _response(b"body"))
+        self.cache.put(other, _response(b"body"))
+        self.cache.put(self.URL, _response(b"changed"))
+
+        self.assertIsNotNone(self.cache.lookup(other))
+        self.assertTrue(pathlib.Path(self.cache.fresh_object(other)[0]).exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+"""
+Checks that the iterative token search of the TinyCSSParser finds the same
+tokens in the same order as the recursive one it replaced. The stylesheets
+of the directory in the LEMMIWINKS_CSS_CORPUS variable are checked too.
+"""
+import os
+import pathlib
+import unittest
+
+from lemmiwinks.parslib import parser
+
+import css_reference
+
+
+def _iterative_tokens(rules):
+    css_parser = parser.TinyCSSParser(rules)
+    css_parser.parse_tokens()
+
+    return ([token.value for token in css_parser.url_tokens],
+            [token.value for token in css_parser.import_tokens])
+
+
+def _corpus():
+    location = os.environ.get("LEMMIWINKS_CSS_CORPUS")
+
+    if location is None:
+        return list()
+
+    return [path.read_bytes().decode("utf-8", "replace")
+            for path in sorted(pathlib.Path(location).rglob("*.css"))]
+
+
+class CssParserEquivalenceTest(unittest.TestCase):
+    def test_stylesheets(self):
+        for data in css_reference.SAMPLE_STYLESHEETS + _corpus():
+            with self.subTest(data=data[:80]):
+                self.__assert_equivalent(css_reference.parse_stylesheet(data))
+
+    def test_declarations(self):
+        for data in css_reference.SAMPLE_DECLARATIONS:
+            with self.subTest(data=data):
+                self.__assert_equivalent(css_reference.parse_declarations(data))
+
+    def test_samples_have_tokens(self):
+        # the samples exercise both kinds of tokens, so the test is not
+        # passed by two searches which find nothing
+        url_count = import_count = 0
+
+        for data in css_reference.SAMPLE_STYLESHEETS:
+            url_tokens, import_tokens = _iterative_tokens(css_reference.parse_stylesheet(data))
+            url_count += len(url_tokens)
+            import_count += len(import_tokens)
+
+        self.assertGreater(url_count, 10)
+        self.assertGreater(import_count, 3)
+
+    def __assert_equivalent(self, rules):
+        self.assertEqual(_iterative_tokens(rules), css_reference.recursive_tokens(rules))
+
+
+if __name__ == "__main__":
+    unittest.main()
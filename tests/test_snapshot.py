@@ -0,0 +1,77 @@
+"""
+Checks that the documents of the previous snapshot are requested
+conditionally and migrated again from the URLs of their files.
+"""
+import asyncio
+import io
+import json
+import tempfile
+import unittest
+import zipfile
+
+import lemmiwinks.httplib as httplib
+from lemmiwinks.archive.migration import snapshot
+
+PAGE = "http://example.test/index.html"
+STYLESHEET = "http://example.test/css/main.css"
+IMAGE = "http://example.test/img/a.png"
+
+
+class _NotModifiedClient:
+    def __init__(self):
+        self.headers = list()
+
+    async def get_request(self, url, headers=None):
+        self.headers.append(headers)
+        return httplib.Response(io.BytesIO(), [(url, 304)])
+
+
+class SnapshotTest(unittest.TestCase):
+    def setUp(self):
+        self.__file = tempfile.NamedTemporaryFile(suffix=".maff")
+        resources = {
+            STYLESHEET: {"path": "index_files/s.css", "etag": '"css"',
+                         "last_modified": None, "sha256": None},
+            IMAGE: {"path": "index_files/a.png", "etag": None,
+                    "last_modified": "Mon, 19 Oct 2026 10:00:00 GMT", "sha256": "digest"},
+        }
+
+        with zipfile.ZipFile(self.__file.name, "w") as zip_file:
+            zip_file.writestr("tab/manifest.json", json.dumps({"url": PAGE, "resources": resources}))
+            zip_file.writestr("tab/index_files/s.css", '.x{background:url("a.png")}')
+            zip_file.writestr("tab/index_files/a.png", b"png")
+
+        self.snapshot = snapshot.Snapshot(self.__file.name)
+
+    def tearDown(self):
+        self.snapshot.close()
+        self.__file.close()
+
+    def __get_request(self, url):
+        http_client = _NotModifiedClient()
+
+        async def get_request():
+            client = snapshot.SnapshotClient(http_client, self.snapshot.tab_for(PAGE))
+            return await client.get_request(url)
+
+        with asyncio.run(get_request()) as response:
+            return http_client.headers[0], response, response.content_descriptor.read()
+
+    def test_document_refers_to_urls(self):
+        headers, response, body = self.__get_request(STYLESHEET)
+
+        self.assertEqual(headers, {"If-None-Match": '"css"'})
+        self.assertEqual(body, f'.x{{background:url("{IMAGE}")}}'.encode())
+        self.assertEqual(response.headers["content-type"], "text/css")
+        self.assertIsNone(response.digest)
+
+    def test_file_is_reused(self):
+        headers, response, body = self.__get_request(IMAGE)
+
+        self.assertEqual(headers, {"If-Modified-Since": "Mon, 19 Oct 2026 10:00:00 GMT"})
+        self.assertEqual(body, b"png")
+        self.assertEqual(response.digest, "digest")
+
+
+if __name__ == "__main__":
+    unittest.main()
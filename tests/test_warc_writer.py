@@ -0,0 +1,64 @@
+"""
+Checks that the WARC writer keeps the records of one exchange in the same
+file and leaves no part of the records which failed.
+"""
+import gzip
+import io
+import re
+import tempfile
+import unittest
+
+import lemmiwinks.httplib as httplib
+from lemmiwinks.archive import warc
+
+
+def _response(url, body):
+    return httplib.Response(io.BytesIO(body), [(url, 200)], {"content-type": "image/png"})
+
+
+class _FailingBody(io.BytesIO):
+    def read(self, *args):
+        raise OSError("body is gone")
+
+
+class WARCWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.__directory = tempfile.TemporaryDirectory()
+        self.prefix = f"{self.__directory.name}/capture"
+
+    def tearDown(self):
+        self.__directory.cleanup()
+
+    def test_exchanges_are_not_split(self):
+        with warc.WARCWriter(self.prefix, max_size=1500) as writer:
+            for index in range(10):
+                url = f"http://example.test/{index}.png"
+                writer.record(url, {"user-agent": "test"}, _response(url, bytes(700)))
+
+        self.assertGreater(len(writer.filepaths), 1)
+
+        for filepath in writer.filepaths:
+            data = gzip.open(filepath).read().decode("latin-1")
+            record_ids = set(re.findall(r"WARC-Record-ID: (<[^>]+>)", data))
+
+            for response_id in re.findall(r"WARC-Concurrent-To: (<[^>]+>)", data):
+                self.assertIn(response_id, record_ids)
+
+    def test_failed_record_is_truncated(self):
+        url = "http://example.test/a.png"
+
+        with warc.WARCWriter(self.prefix) as writer:
+            writer.record(url, None, _response(url, b"body"))
+            size = writer._fd.tell()
+
+            with self.assertRaises(OSError):
+                writer.record(url, None, httplib.Response(_FailingBody(b"x"), [(url, 200)]))
+
+            self.assertEqual(writer._fd.tell(), size)
+
+        data = gzip.open(writer.filepaths[0]).read().decode("latin-1")
+        self.assertEqual(data.count("WARC-Type: response"), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()